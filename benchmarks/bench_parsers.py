@@ -0,0 +1,170 @@
+# parser benchmarks over synthetic files
+# usage: python benchmarks/bench_parsers.py [--quick] [--filter TEXT] [--json results.json] [--compare baseline.json]
+
+import argparse
+import gc
+import io
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # run from a checkout
+
+from mafia_4ds.io_helper import BufferReader
+from mafia_4ds import parse_4ds as FourDS
+from mafia_4ds import parse_5ds as FiveDS
+
+from synthetic import make_4ds, make_5ds
+
+
+CASES_4DS = {  # name: make_4ds arguments
+    'static_small': dict(num_vertices=1000, num_faces=1500),
+    'static_large': dict(num_vertices=60000, num_faces=90000, num_materials=16),
+    'static_lods': dict(num_vertices=30000, num_faces=45000, num_lods=4),
+    'scene_many_meshes': dict(num_vertices=200, num_faces=300, num_meshes=500),
+    'skinned': dict(num_vertices=20000, num_faces=30000, num_lods=2, num_bones=60),
+    'morph': dict(num_vertices=8000, num_faces=12000, num_targets=16),
+}
+
+CASES_5DS = {  # name: make_5ds arguments
+    'anim_short': dict(num_bones=30, num_frames=100),
+    'anim_cutscene': dict(num_bones=200, num_frames=5000),
+    'anim_sparse': dict(num_bones=200, num_frames=5000, key_step=25),
+}
+
+
+def read_4ds(data, lazy=False):
+    fo = FourDS.FourDSFile()
+    fo.read(BufferReader(data), lazy)
+    return fo
+
+
+def read_5ds(data):
+    fi = FiveDS.FiveDSFile()
+    fi.read(BufferReader(data))
+    return fi
+
+
+def index_5ds(data):
+    fi = FiveDS.FiveDSIndex()
+    fi.read(BufferReader(data))
+    return fi
+
+
+def write_file(obj):
+    obj.write(io.BytesIO())
+
+
+def measure(function, min_time, min_repeats):  # seconds of every run, with the garbage collector paused
+    function()  # warm up
+
+    times = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        total = 0.0
+        while len(times) < min_repeats or total < min_time:
+            start = time.perf_counter()
+            function()
+            elapsed = time.perf_counter() - start
+            times.append(elapsed)
+            total += elapsed
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    return times
+
+
+def benchmarks(quick):
+    for name, arguments in CASES_4DS.items():
+        fo = make_4ds(**arguments)
+        buffer = io.BytesIO()
+        fo.write(buffer)
+        data = buffer.getvalue()
+        parsed = read_4ds(data)
+
+        yield '4ds.read.' + name, arguments, len(data), lambda: read_4ds(data)
+        yield '4ds.read_lazy.' + name, arguments, len(data), lambda: read_4ds(data, lazy=True)
+        yield '4ds.write.' + name, arguments, len(data), lambda: write_file(parsed)
+        if quick:
+            break
+
+    for name, arguments in CASES_5DS.items():
+        fi = make_5ds(**arguments)
+        buffer = io.BytesIO()
+        fi.write(buffer)
+        data = buffer.getvalue()
+        parsed = read_5ds(data)
+
+        yield '5ds.read.' + name, arguments, len(data), lambda: read_5ds(data)
+        yield '5ds.index.' + name, arguments, len(data), lambda: index_5ds(data)
+        yield '5ds.write.' + name, arguments, len(data), lambda: write_file(parsed)
+        if quick:
+            break
+
+
+def run(quick=False, name_filter=None):
+    min_time = 0.05 if quick else 0.5
+    min_repeats = 3 if quick else 10
+
+    results = []
+    for name, arguments, size, function in benchmarks(quick):
+        if name_filter and name_filter not in name:
+            continue
+
+        times = measure(function, min_time, min_repeats)
+        quartiles = statistics.quantiles(times, n=4)
+        results.append({
+            'name': name,
+            'arguments': arguments,
+            'bytes': size,
+            'repeats': len(times),
+            'min': min(times),
+            'median': statistics.median(times),
+            'iqr': quartiles[2] - quartiles[0],
+            'mb_per_s': size / statistics.median(times) / 1e6,
+        })
+        print(format_result(results[-1]), flush=True)
+
+    return results
+
+
+def format_result(result, baseline=None):
+    line = '{:<36} {:>9.3f} ms  (min {:>9.3f}, iqr {:>7.3f}, {:>4} runs)  {:>8.1f} MB/s'.format(
+        result['name'], result['median'] * 1e3, result['min'] * 1e3, result['iqr'] * 1e3,
+        result['repeats'], result['mb_per_s'])
+
+    if baseline:
+        line += '  {:>6.2f}x vs baseline'.format(baseline['median'] / result['median'])
+
+    return line
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the 4ds and 5ds parsers on synthetic files.')
+    parser.add_argument('--quick', action='store_true', help='one small case per format, few repeats')
+    parser.add_argument('--filter', help='only run benchmarks whose name contains this text')
+    parser.add_argument('--json', help='write the results to this json file')
+    parser.add_argument('--compare', help='json results of an earlier run, printed as speedups')
+    args = parser.parse_args(argv)
+
+    results = run(args.quick, args.filter)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'python': sys.version, 'results': results}, f, indent=1)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = dict((result['name'], result) for result in json.load(f)['results'])
+
+        print('\ncompared to {}:'.format(args.compare))
+        for result in results:
+            print(format_result(result, baseline.get(result['name'])))
+
+
+if __name__ == '__main__':
+    main()
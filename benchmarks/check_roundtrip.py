@@ -0,0 +1,83 @@
+# checks that the 4ds and 5ds writers give back the exact bytes the parsers read
+# usage: python benchmarks/check_roundtrip.py, exits with 1 when a file changes
+
+import io
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # run from a checkout
+
+from mafia_4ds.io_helper import BufferReader
+from mafia_4ds import parse_4ds as FourDS
+from mafia_4ds import parse_5ds as FiveDS
+
+from synthetic import make_4ds, make_5ds
+
+
+def to_bytes(obj):
+    buffer = io.BytesIO()
+    obj.write(buffer)
+    return buffer.getvalue()
+
+
+def cases_4ds():
+    yield 'static', make_4ds(num_vertices=1000, num_faces=1500)
+    yield 'lods', make_4ds(num_vertices=1000, num_faces=1500, num_lods=3)
+    yield 'skinned', make_4ds(num_vertices=1000, num_faces=1500, num_lods=2, num_bones=8)
+    yield 'morph', make_4ds(num_vertices=1000, num_faces=1500, num_targets=4)
+    yield 'scene', make_4ds(num_vertices=50, num_faces=40, num_meshes=20)
+
+    fo = make_4ds(num_vertices=100, num_faces=100, num_targets=2)
+    fo.materials[0].diffuse_texture = 'MIXED_Case.BMP'  # written back as spelled in the file
+    region = fo.nodes[0].frame.object.shape_keys.regions[0][0]
+    region.indices_flag = 0  # morph region without vertex indices
+    region.vertex_indices = None
+    yield 'texture case, morph without indices', fo
+
+
+def cases_5ds():
+    fi = make_5ds(num_bones=10, num_frames=100)
+    for anim in fi.bone_animations:  # tracks with an even key count are padded, the padding words are kept
+        anim.position_padding = 0x1234
+        anim.scale_padding = 0xabcd
+    yield 'even key counts', fi
+    yield 'odd key counts', make_5ds(num_bones=10, num_frames=101)
+    yield 'sparse keys', make_5ds(num_bones=10, num_frames=1000, key_step=7)
+
+    fi = make_5ds(num_bones=4, num_frames=10)
+    anim = fi.bone_animations[1]
+    anim.position_frames = np.empty(0, dtype=np.uint16)  # empty track
+    anim.position_keys = np.empty((0, 3), dtype=np.float32)
+    anim.has_rotation = False  # no track at all
+    yield 'empty and missing tracks', fi
+
+
+def check(name, data, cls, **read_args):
+    obj = cls()
+    obj.read(BufferReader(data), **read_args)
+    if to_bytes(obj) != data:
+        print('FAILED {} ({})'.format(name, cls.__name__ + (' lazy' if read_args else '')))
+        return False
+    return True
+
+
+def main():
+    passed = True
+    for name, fo in cases_4ds():
+        data = to_bytes(fo)
+        passed &= check(name, data, FourDS.FourDSFile)
+        passed &= check(name, data, FourDS.FourDSFile, lazy=True)
+
+    for name, fi in cases_5ds():
+        data = to_bytes(fi)
+        passed &= check(name, data, FiveDS.FiveDSFile)
+        passed &= check(name, data, FiveDS.FiveDSIndex)
+
+    print('round trip ok' if passed else 'round trip FAILED')
+    return 0 if passed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,169 @@
+# synthetic 4ds and 5ds files of scalable size, built from the parser objects and serialized by their writers
+
+import numpy as np
+
+from mafia_4ds import parse_4ds as FourDS
+from mafia_4ds import parse_5ds as FiveDS
+
+
+IDENTITY_MATRIX = [(1.0, 0.0, 0.0, 0.0), (0.0, 1.0, 0.0, 0.0), (0.0, 0.0, 1.0, 0.0), (0.0, 0.0, 0.0, 1.0)]
+
+
+def make_material(material_id):
+    material = FourDS.Material()
+    material.flags = 0x00040000 | 0x00800000  # UseDiffuseTex, MipMapping
+    material.matProps = FourDS.MatProps(material.flags)
+    material.ambient_color = (1.0, 1.0, 1.0)
+    material.diffuse_color = (1.0, 1.0, 1.0)
+    material.emission_color = (0.0, 0.0, 0.0)
+    material.alpha = 1.0
+    material.metallic = 0.0
+    material.diffuse_texture = 'synthetic{:03d}.bmp'.format(material_id)
+    return material
+
+
+def make_node(node_type, name, parent_id, frame):
+    node = FourDS.Node()
+    node.type = node_type
+    node.parent_id = parent_id
+    node.location = (0.0, 0.0, 0.0)
+    node.scale = (1.0, 1.0, 1.0)
+    node.rotation = (1.0, 0.0, 0.0, 0.0)
+    node.culling_flags = 9
+    node.name = name
+    node.parameters = ''
+    node.frame = frame
+    return node
+
+
+def make_lod(rng, num_vertices, num_faces, num_materials, lod_id):
+    lod = FourDS.Lod()
+    lod.clipping_range = 100.0 * (lod_id + 1)
+    lod.vertex_data = rng.uniform(-1.0, 1.0, (num_vertices, 8)).astype(np.float32)
+
+    lod.face_groups = []
+    for material_id, indices in enumerate(np.array_split(np.arange(num_faces), num_materials)):
+        face_group = FourDS.FaceGroup()
+        face_group.indices = rng.integers(0, num_vertices, (len(indices), 3), dtype=np.uint16)
+        face_group.material_id = material_id + 1
+        lod.face_groups.append(face_group)
+
+    return lod
+
+
+def make_skin(rng, num_vertices, num_bones):
+    skin = FourDS.Skin()
+    skin.dmin = (-1.0, -1.0, -1.0)
+    skin.dmax = (1.0, 1.0, 1.0)
+
+    # every bone gets a range of locked vertices followed by a range of weighted ones
+    share = num_vertices // num_bones
+    for bone_id in range(num_bones):
+        vertex_group = FourDS.VertexGroup()
+        vertex_group.matrix = IDENTITY_MATRIX
+        vertex_group.num_locked_vertices = share // 2
+        vertex_group.num_weighted_vertices = share - share // 2
+        vertex_group.parent_id = 0
+        vertex_group.dmin = (-1.0, -1.0, -1.0)
+        vertex_group.dmax = (1.0, 1.0, 1.0)
+        vertex_group.weights = rng.uniform(0.0, 1.0, vertex_group.num_weighted_vertices).astype(np.float32)
+        skin.vertex_groups.append(vertex_group)
+
+    skin.num_locked_vertices = sum(vg.num_locked_vertices for vg in skin.vertex_groups)
+    return skin
+
+
+def make_shape_keys(rng, lod_vertices, num_targets):
+    shape_keys = FourDS.ShapeKeys()
+    shape_keys.num_targets = num_targets
+
+    for num_vertices in lod_vertices:
+        region = FourDS.MorphRegion()
+        morphed = num_vertices // 4
+        region.positions = rng.uniform(-1.0, 1.0, (num_targets, morphed, 3)).astype(np.float32)
+        region.normals = rng.uniform(-1.0, 1.0, (num_targets, morphed, 3)).astype(np.float32)
+        region.indices_flag = 1
+        region.vertex_indices = np.arange(morphed, dtype=np.uint16)
+        shape_keys.regions.append([region])
+
+    shape_keys.dmin = (-1.0, -1.0, -1.0)
+    shape_keys.dmax = (1.0, 1.0, 1.0)
+    shape_keys.origin = (0.0, 0.0, 0.0)
+    shape_keys.radius = 1.0
+    return shape_keys
+
+
+def make_4ds(num_vertices=10000, num_faces=15000, num_lods=1, num_bones=0, num_targets=0, num_materials=4,
+             num_meshes=1, seed=0):
+    # num_vertices and num_faces are per mesh for its first lod, every further lod halves them
+    rng = np.random.default_rng(seed)
+
+    fo = FourDS.FourDSFile()
+    fo.version = 0x1d
+    fo.timestamp = 0
+    fo.is_animated = 0
+    fo.materials = [make_material(material_id) for material_id in range(num_materials)]
+
+    visual_type = {(False, False): 0x00, (True, False): 0x02, (True, True): 0x03, (False, True): 0x05}[
+        (num_bones > 0, num_targets > 0)]
+
+    for mesh_id in range(num_meshes):
+        mesh = FourDS.Mesh(weights=num_bones > 0, shape_keys=num_targets > 0)
+        mesh.instance_id = 0
+
+        lod_vertices = [max(3, num_vertices >> lod_id) for lod_id in range(num_lods)]
+        for lod_id, lod_num_vertices in enumerate(lod_vertices):
+            lod_num_faces = max(1, num_faces >> lod_id)
+            mesh.lods.append(make_lod(rng, lod_num_vertices, lod_num_faces, num_materials, lod_id))
+
+        if num_bones > 0:
+            mesh.skins = [make_skin(rng, lod_num_vertices, num_bones) for lod_num_vertices in lod_vertices]
+
+        if num_targets > 0:
+            mesh.shape_keys = make_shape_keys(rng, lod_vertices, num_targets)
+
+        frame = FourDS.VisualFrame(visual_type, 0)
+        frame.object = mesh
+        fo.nodes.append(make_node(0x01, 'mesh{}'.format(mesh_id), 0, frame))
+
+        mesh_node_id = len(fo.nodes)
+        for bone_id in range(num_bones):
+            bone = FourDS.Bone()
+            bone.matrix = IDENTITY_MATRIX
+            bone.id = bone_id
+            parent_id = mesh_node_id if bone_id == 0 else len(fo.nodes)
+            fo.nodes.append(make_node(10, 'mesh{}_bone{}'.format(mesh_id, bone_id), parent_id, bone))
+
+    return fo
+
+
+def make_5ds(num_bones=50, num_frames=1000, key_step=1, seed=0):
+    # every bone animates rotation, position and scale with a key every key_step frames
+    rng = np.random.default_rng(seed)
+
+    fi = FiveDS.FiveDSFile()
+    fi.version = 20
+    fi.timestamp = 0
+    fi.unknown_1 = 0
+    fi.num_frames = num_frames
+    fi.links = [(bone_id, 0) for bone_id in range(num_bones)]
+    fi.bone_names = ['bone{}'.format(bone_id) for bone_id in range(num_bones)]
+
+    frames = np.arange(0, num_frames, key_step, dtype=np.uint16)
+    fi.bone_animations = []
+    for bone_id in range(num_bones):
+        anim = FiveDS.BoneAnimation()
+        anim.flags = FiveDS.KEY_ROTATION | FiveDS.KEY_POSITION | FiveDS.KEY_SCALE
+        anim.has_rotation = anim.has_position = anim.has_scale = True
+        anim.has_unknown = False
+
+        rotations = rng.normal(size=(len(frames), 4)).astype(np.float32)
+        anim.rotation_frames = frames
+        anim.rotation_keys = rotations / np.linalg.norm(rotations, axis=1, keepdims=True)
+        anim.position_frames = frames
+        anim.position_keys = rng.uniform(-1.0, 1.0, (len(frames), 3)).astype(np.float32)
+        anim.scale_frames = frames
+        anim.scale_keys = np.ones((len(frames), 3), dtype=np.float32)
+        fi.bone_animations.append(anim)
+
+    return fi
@@ -28,13 +28,17 @@ if "bpy" in locals():
     #    importlib.reload(mafia_4ds_export)
 
 
-import bpy
-
-from mafia_4ds import mafia_4ds_preferences
-from mafia_4ds import mafia_4ds_material_properties
-from mafia_4ds import mafia_4ds_mesh_properties
-from mafia_4ds import mafia_4ds_import
-#from mafia_4ds import mafia_4ds_export
+try:
+    import bpy
+except ImportError:  # imported outside of blender by the headless tools, parsers only
+    bpy = None
+
+if bpy:
+    from mafia_4ds import mafia_4ds_preferences
+    from mafia_4ds import mafia_4ds_material_properties
+    from mafia_4ds import mafia_4ds_mesh_properties
+    from mafia_4ds import mafia_4ds_import
+    #from mafia_4ds import mafia_4ds_export
 
 
 def register():
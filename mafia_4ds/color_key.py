@@ -0,0 +1,141 @@
+# color key of a texture read straight from the bmp or tga file
+# the key is the right-bottom corner pixel, the same one blender's image.pixels has at index width - 1,
+# reading it from the file avoids loading the whole image and converting it into a python float sequence
+
+import os
+import struct
+from struct import Struct
+
+
+BMP_FILE_HEADER = Struct('<2sIHHI')  # magic, file size, reserved, reserved, pixel data offset
+BMP_CORE_HEADER = Struct('<IHHHH')  # header size, width, height, planes, bits per pixel
+BMP_INFO_HEADER = Struct('<IiiHHIIiiII')  # header size, width, height, planes, bits per pixel, compression, ...
+TGA_HEADER = Struct('<BBBHHBHHHHBB')
+
+BI_RGB = 0
+BI_BITFIELDS = 3
+
+
+def read_key_color(filepath):  # (r, g, b, a) in 0..1, None for formats blender has to decode itself
+    with open(filepath, 'rb') as f:
+        magic = f.read(2)
+        f.seek(0)
+        if magic == b'BM':
+            return read_bmp_key_color(f)
+        elif os.path.splitext(filepath)[1].lower() == '.tga':
+            return read_tga_key_color(f)
+
+    return None
+
+
+def read_bmp_key_color(f):
+    header = f.read(BMP_FILE_HEADER.size + BMP_INFO_HEADER.size)
+    pixel_offset = BMP_FILE_HEADER.unpack_from(header)[4]
+
+    header_size = Struct('<I').unpack_from(header, BMP_FILE_HEADER.size)[0]
+    if header_size == BMP_CORE_HEADER.size:  # os/2 bitmap, 3 byte palette entries
+        _, width, height, _, bits = BMP_CORE_HEADER.unpack_from(header, BMP_FILE_HEADER.size)
+        compression = BI_RGB
+        palette_entry = 3
+        num_colors = 0
+    else:
+        info = BMP_INFO_HEADER.unpack_from(header, BMP_FILE_HEADER.size)
+        width, height, bits, compression, num_colors = info[1], info[2], info[4], info[5], info[9]
+        palette_entry = 4
+
+    if width <= 0 or height == 0:
+        return None
+
+    # rows are stored bottom-up, negative height means top-down
+    row_size = (width * bits + 31) // 32 * 4
+    bottom_row = 0 if height > 0 else -height - 1
+    x = width - 1
+
+    if bits in (1, 4, 8) and compression == BI_RGB:
+        f.seek(pixel_offset + bottom_row * row_size + x * bits // 8)
+        shift = 8 - bits - x * bits % 8
+        color_id = (f.read(1)[0] >> shift) & ((1 << bits) - 1)
+
+        if num_colors and color_id >= num_colors:
+            return None
+
+        f.seek(BMP_FILE_HEADER.size + header_size + color_id * palette_entry)
+        blue, green, red = f.read(3)
+        return red / 255, green / 255, blue / 255, 1.0
+
+    elif bits == 24 and compression == BI_RGB:
+        f.seek(pixel_offset + bottom_row * row_size + x * 3)
+        blue, green, red = f.read(3)
+        return red / 255, green / 255, blue / 255, 1.0
+
+    elif bits == 32 and compression in (BI_RGB, BI_BITFIELDS):
+        masks = (0x00ff0000, 0x0000ff00, 0x000000ff)
+        if compression == BI_BITFIELDS:  # masks follow the info header or are its part in newer versions
+            f.seek(BMP_FILE_HEADER.size + 40)
+            masks = Struct('<3I').unpack(f.read(12))
+            if any(mask not in (0xff, 0xff00, 0xff0000, 0xff000000) for mask in masks):
+                return None
+
+        f.seek(pixel_offset + bottom_row * row_size + x * 4)
+        value = Struct('<I').unpack(f.read(4))[0]
+        red, green, blue = ((value & mask) // (mask & -mask) for mask in masks)
+        return red / 255, green / 255, blue / 255, 1.0
+
+    return None  # run-length encoded, 16 bit and other rare formats
+
+
+def read_tga_key_color(f):
+    (id_length, colormap_type, image_type, colormap_first, colormap_length, colormap_bits,
+     _, _, width, height, bits, descriptor) = TGA_HEADER.unpack(f.read(TGA_HEADER.size))
+
+    if image_type not in (1, 2, 3) or width == 0 or height == 0:  # run-length encoded types are 9 to 11
+        return None
+
+    colormap_offset = TGA_HEADER.size + id_length
+    pixel_offset = colormap_offset
+    if colormap_type == 1:
+        pixel_offset += colormap_length * ((colormap_bits + 7) // 8)
+
+    # origin is bottom-left unless the descriptor flips it
+    bottom_row = height - 1 if descriptor & 0x20 else 0
+    x = 0 if descriptor & 0x10 else width - 1
+
+    pixel_size = (bits + 7) // 8
+    f.seek(pixel_offset + (bottom_row * width + x) * pixel_size)
+    pixel = f.read(pixel_size)
+
+    if image_type == 1 and colormap_type == 1 and bits == 8 and colormap_bits in (24, 32):
+        color_id = pixel[0] - colormap_first
+        if not 0 <= color_id < colormap_length:
+            return None
+
+        entry_size = colormap_bits // 8
+        f.seek(colormap_offset + color_id * entry_size)
+        pixel = f.read(entry_size)
+    elif image_type == 3 and bits == 8:
+        return pixel[0] / 255, pixel[0] / 255, pixel[0] / 255, 1.0
+    elif image_type != 2 or bits not in (24, 32):
+        return None
+
+    alpha = pixel[3] / 255 if len(pixel) == 4 else 1.0
+    return pixel[2] / 255, pixel[1] / 255, pixel[0] / 255, alpha
+
+
+_key_colors = {}  # file path to (mtime, color), kept for the session
+
+
+def key_color(filepath):  # cached read_key_color, None for missing or unsupported files
+    try:
+        mtime = os.stat(filepath).st_mtime_ns
+    except OSError:
+        return None
+
+    cached = _key_colors.get(filepath)
+    if cached is None or cached[0] != mtime:
+        try:
+            color = read_key_color(filepath)
+        except (OSError, IndexError, ValueError, struct.error):  # truncated or damaged
+            color = None
+        cached = _key_colors[filepath] = (mtime, color)
+
+    return cached[1]
@@ -1,59 +1,117 @@
-from struct import unpack
+import mmap
+from struct import Struct
+
+import numpy as np
+
+
+# precompiled little-endian codecs
+UBYTE = Struct('<B')
+USHORT = Struct('<H')
+UINT = Struct('<I')
+ULONG = Struct('<Q')
+FLOAT = Struct('<f')
+DOUBLET = Struct('<2f')
+TRIPLET = Struct('<3f')
+QUARTET = Struct('<4f')
+
+# fixed-layout records, each decoded with a single unpack
+MATRIX = Struct('<16f')
+TRANSFORM = Struct('<3f3f4f')  # node location, scale, rotation
+COLORS = Struct('<3f3f3ff')  # material ambient, diffuse, emission color, alpha
+VERTEX_GROUP_HEADER = Struct('<16f3I3f3f')  # matrix, locked and weighted vertex count, parent id, bounds
+
+
+class BufferReader:  # file-like reader over bytes, mmap or memoryview, reads return views instead of copies
+    def __init__(self, buffer, offset=0):
+        self.buffer = memoryview(buffer)
+        self.position = offset
+
+    @classmethod
+    def from_file(cls, filepath):  # the mapping stays alive as long as the reader or any view of it
+        with open(filepath, 'rb') as f:
+            try:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # empty files can't be mapped
+                buffer = b''
+        return cls(buffer)
+
+    def read(self, size=-1):
+        start = self.position
+        end = len(self.buffer) if size < 0 else min(start + size, len(self.buffer))
+        self.position = end
+        return self.buffer[start:end]
+
+    def unpack(self, codec):
+        values = codec.unpack_from(self.buffer, self.position)
+        self.position += codec.size
+        return values
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self.position
+        elif whence == 2:
+            offset += len(self.buffer)
+        self.position = offset
+        return self.position
+
+    def tell(self):
+        return self.position
+
+
+def read_struct(reader, codec):
+    if isinstance(reader, BufferReader):
+        return reader.unpack(codec)
+    return codec.unpack(reader.read(codec.size))
 
 
 def read_ushort(reader):
-    return unpack(b'<H', reader.read(2))[0]
+    return read_struct(reader, USHORT)[0]
 
 
 def read_uint(reader):
-    return unpack(b'<I', reader.read(4))[0]
+    return read_struct(reader, UINT)[0]
 
 
 def read_ulong(reader):
-    return unpack(b'<Q', reader.read(8))[0]
+    return read_struct(reader, ULONG)[0]
 
 
 def read_float(reader):
-    return unpack(b'<f', reader.read(4))[0]
+    return read_struct(reader, FLOAT)[0]
 
 
 def read_doublet(reader):
-    return unpack('ff', reader.read(4 * 2))
+    return read_struct(reader, DOUBLET)
 
 
 def read_triplet(reader):
-    return unpack('fff', reader.read(4 * 3))
+    return read_struct(reader, TRIPLET)
 
 
 def read_quartet(reader):
-    return unpack('ffff', reader.read(4 * 4))
+    return read_struct(reader, QUARTET)
+
+
+def read_array(reader, dtype, count):  # little-endian block of count items, decoded in one read
+    dtype = np.dtype(dtype)
+    array = np.frombuffer(reader.read(dtype.itemsize * count), dtype, count)
+    return array.astype(dtype.newbyteorder('='))  # native and writable copy
 
 
 def read_ubyte(reader):
-    return unpack(b'B', reader.read(1))[0]
+    return read_struct(reader, UBYTE)[0]
 
 
 def read_string_fixed(reader, length):
-    bytes = reader.read(length)
-    string = bytes.decode('ISO-8859-2')  # extended ascii characters appear in game files
+    data = reader.read(length)
+    string = str(data, 'ISO-8859-2')  # extended ascii characters appear in game files
     return string
 
 
 def read_string_array(reader): # '\0'-separated array of strings, terminated with EOF
-    array = []
-    bytes = []
-
-    while True:
-        byte = reader.read(1)
-        if byte == b'':
-            return array
-        elif byte == b'\0':
-            bstr = b''.join(bytes)
-            string = bstr.decode('ISO-8859-2')
-            array.append(string)
-            bytes = []
-        else:
-            bytes.append(byte)
+    data = bytes(reader.read())  # rest of the file, a single view slice for BufferReader
+    strings = data.split(b'\0')[:-1]  # bytes after the last '\0' are not a string
+    return [string.decode('ISO-8859-2') for string in strings]
 
 
 def read_string(reader):
@@ -62,12 +120,72 @@ def read_string(reader):
 
 
 def read_matrix(reader):  # 4x4 float matrix
-    rows = [read_quartet(reader) for _ in range(4)]
+    return matrix_from_floats(read_struct(reader, MATRIX))
+
+
+def matrix_from_floats(floats):  # 16 floats in file order
+    rows = [floats[i:i + 4] for i in range(0, 16, 4)]
     rows = [(ntlet[0], ntlet[2], ntlet[1], ntlet[3]) for ntlet in rows]  # first order columns
     rows = [rows[0], rows[2], rows[1], rows[3]]  # then rows
     return rows
 
 
+def write_struct(writer, codec, *values):
+    writer.write(codec.pack(*values))
+
+
+def write_ubyte(writer, value):
+    write_struct(writer, UBYTE, value)
+
+
+def write_ushort(writer, value):
+    write_struct(writer, USHORT, value)
+
+
+def write_uint(writer, value):
+    write_struct(writer, UINT, value)
+
+
+def write_ulong(writer, value):
+    write_struct(writer, ULONG, value)
+
+
+def write_float(writer, value):
+    write_struct(writer, FLOAT, value)
+
+
+def write_triplet(writer, ntlet):
+    write_struct(writer, TRIPLET, *ntlet)
+
+
+def write_quartet(writer, ntlet):
+    write_struct(writer, QUARTET, *ntlet)
+
+
+def write_array(writer, array, dtype):  # whole block packed at once, dtype should be little-endian
+    writer.write(np.ascontiguousarray(array, dtype).tobytes())
+
+
+def write_string_fixed(writer, string):
+    writer.write(string.encode('ISO-8859-2'))
+
+
+def write_string(writer, string):
+    data = string.encode('ISO-8859-2')
+    write_ubyte(writer, len(data))
+    writer.write(data)
+
+
+def write_matrix(writer, matrix):
+    write_struct(writer, MATRIX, *matrix_to_floats(matrix))
+
+
+def matrix_to_floats(rows):  # inverse of matrix_from_floats, both swaps undo themselves
+    rows = [rows[0], rows[2], rows[1], rows[3]]
+    rows = [(ntlet[0], ntlet[2], ntlet[1], ntlet[3]) for ntlet in rows]
+    return [value for ntlet in rows for value in ntlet]
+
+
 def flip_axes(ntlet):
     n = len(ntlet)
     assert n == 2 or n == 3 or n == 4
@@ -78,3 +196,17 @@ def flip_axes(ntlet):
         return ntlet[0], ntlet[2], ntlet[1]
     else:
         return ntlet[0], ntlet[1], ntlet[3], ntlet[2]
+
+
+def flip_axes_array(array):  # flip_axes over the last axis of a whole array
+    n = array.shape[-1]
+    assert n == 2 or n == 3 or n == 4
+
+    if n == 2:
+        flipped = array.astype(np.float64)  # same precision as the python float arithmetic in flip_axes
+        flipped[..., 1] = 1 - flipped[..., 1]
+        return flipped
+    elif n == 3:
+        return np.ascontiguousarray(array[..., (0, 2, 1)])
+    else:
+        return np.ascontiguousarray(array[..., (0, 1, 3, 2)])
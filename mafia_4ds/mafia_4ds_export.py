@@ -1,5 +1,6 @@
 import bpy
 import bmesh
+import os
 import struct
 
 from bpy        import ops
@@ -9,6 +10,9 @@ from bpy        import types
 from bpy        import utils
 from bpy_extras import io_utils
 
+from .          import parse_4ds as FourDS
+from .          import validate_4ds
+
 
 class Mafia4ds_Exporter:
     def __init__(self, config):
@@ -342,9 +346,28 @@ class Mafia4ds_Exporter:
     
     
     def Export(self, filename):
-        with open(filename, "wb") as writer:
-            self.SerializeFile(writer)
+        # write next to the target, read it back, check it and only then replace the target
+        tempFilename = filename + ".tmp"
         
+        try:
+            with open(tempFilename, "wb") as writer:
+                self.SerializeFile(writer)
+            
+            with open(tempFilename, "rb") as reader:
+                fo = FourDS.FourDSFile()
+                fo.read(reader)
+            
+            validate_4ds.check(fo)
+        except (ValueError, struct.error) as e:
+            os.remove(tempFilename)
+            ShowError("Export produced an invalid file, {} was not written.\n{}".format(filename, e))
+            return {'CANCELLED'}
+        except Exception:
+            if os.path.exists(tempFilename):
+                os.remove(tempFilename)
+            raise
+        
+        os.replace(tempFilename, filename)
         return {'FINISHED'}
 
 
@@ -1,5 +1,7 @@
 import bpy
 import bmesh
+import hashlib
+import numpy as np
 import os
 import time
 from mathutils import Matrix, Vector
@@ -13,19 +15,49 @@ from bpy_extras import io_utils
 from bpy_extras import node_shader_utils
 from bpy_extras import image_utils
 
+from . io_helper import BufferReader, flip_axes_array
 from . import parse_4ds as FourDS
 from . import parse_5ds as FiveDS
+from . import color_key
+from . import texture_index
+from . import validate_4ds
+
+
+image_cache = {}  # file path to image name, shared by all imports of the session
+material_cache = {}  # content key to material name
 
 
 def blen_load_image(filepath: str):
+    image = bpy.data.images.get(image_cache.get(filepath, ''))
+    if image and image.filepath == filepath:
+        return image
+
     image = image_utils.load_image(
         filepath,
         place_holder=True,
         check_existing=True,
     )
+    image_cache[filepath] = image.name
     return image
 
 
+def blen_build_mesh(me, vertices, loop_vertices):
+    # triangle mesh straight from arrays, vertices (n, 3) and loop_vertices 3 vertex indices per triangle
+    num_triangles = len(loop_vertices) // 3
+
+    me.vertices.add(len(vertices))
+    me.vertices.foreach_set('co', np.ascontiguousarray(vertices, dtype=np.float32).ravel())
+
+    me.loops.add(len(loop_vertices))
+    me.loops.foreach_set('vertex_index', loop_vertices)
+
+    me.polygons.add(num_triangles)
+    me.polygons.foreach_set('loop_start', np.arange(0, 3 * num_triangles, 3, dtype=np.int32))
+    me.polygons.foreach_set('loop_total', np.full(num_triangles, 3, dtype=np.int32))
+
+    me.update(calc_edges=True)
+
+
 def srgb_to_linearrgb(color):
     out = []
     for c in color:
@@ -39,6 +71,29 @@ def srgb_to_linearrgb(color):
     return tuple(out)
 
 
+def material_key(material: FourDS.Material):
+    # the textures are loaded from the data path, a material imported from other game data is another material
+    values = (GetPreferences().DataPath, material.flags, material.ambient_color, material.diffuse_color,
+              material.emission_color, material.alpha, material.metallic, material.diffuse_texture,
+              material.alpha_texture, material.environment_texture, material.animated_frames,
+              material.animated_frames_length)
+    return hashlib.blake2b(repr(values).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def blen_get_material(material: FourDS.Material):
+    # materials with the same content are created once, the key stored on the material
+    # tells whether the cached name still refers to it (materials get renamed, deleted or files reloaded)
+    key = material_key(material)
+    bma = bpy.data.materials.get(material_cache.get(key, ''))
+    if bma and bma.get('mafia_4ds_key') == key:
+        return bma
+
+    bma = blen_create_material(material)
+    bma['mafia_4ds_key'] = key
+    material_cache[key] = bma.name
+    return bma
+
+
 def blen_create_material(material: FourDS.Material):
     bma = bpy.data.materials.new(material.diffuse_texture)
     bma_wrap = node_shader_utils.PrincipledBSDFWrapper(bma, is_readonly=False, use_nodes=True)
@@ -49,23 +104,27 @@ def blen_create_material(material: FourDS.Material):
     bma_wrap.roughness = 0.0
 
     texture_wrapper = bma_wrap.base_color_texture
+    textures = texture_index.texture_index(GetPreferences().DataPath)
 
-    filepath = '{}maps/{}'.format(GetPreferences().DataPath, material.diffuse_texture)
-    diffuse_image = blen_load_image(filepath)
+    diffuse_image = blen_load_image(textures.path(material.diffuse_texture))
     texture_wrapper.image = diffuse_image
 
     if material.has_effect:
         assert not (material.alpha_texture and material.use_alpha_color)  # hopefully this won't happen
 
         if material.alpha_texture:
-            alpha_image = blen_load_image(material.alpha_texture)
+            alpha_image = blen_load_image(textures.path(material.alpha_texture))
             bma_wrap.alpha_texture.image = alpha_image
         elif material.use_alpha_color:
             bma.blend_method = 'CLIP'
 
-            width, height = diffuse_image.size
-            dw = width - 1
-            background_color = diffuse_image.pixels[dw * 4:(dw + 1) * 4]  # color of the right-bottom corner pixel
+            # color of the right-bottom corner pixel, read from the texture file when its format allows
+            diffuse_path = textures.find(material.diffuse_texture)
+            background_color = color_key.key_color(diffuse_path) if diffuse_path else None
+            if background_color is None:
+                width, height = diffuse_image.size
+                dw = width - 1
+                background_color = diffuse_image.pixels[dw * 4:(dw + 1) * 4]
 
             nodes = bma.node_tree.nodes
             links = bma.node_tree.links
@@ -273,70 +332,63 @@ class FourDSImporter:
             self.apply_transform(node, obj)
             lod_objects.append(obj)
 
-            # build mesh
-            all_faces = []
-            material_ids = []
-            for face_group in lod.face_groups:
-                all_faces.extend(face_group.faces)
-                material_ids.extend([face_group.material_id] * len(face_group.faces))
+            # build mesh, faces of all face groups in order with flipped winding
+            faces = np.concatenate([face_group.indices for face_group in lod.face_groups] +
+                                   [np.empty((0, 3), dtype=np.uint16)])
+            loop_vertices = faces[:, (0, 2, 1)].ravel().astype(np.int32)
 
-            me.from_pydata(lod.vertices, [], all_faces)
+            blen_build_mesh(me, flip_axes_array(lod.vertex_data[:, 0:3]), loop_vertices)
 
             # set up normals
-            me.flip_normals()
-            me.normals_split_custom_set_from_vertices(lod.normals)
+            me.normals_split_custom_set_from_vertices(flip_axes_array(lod.vertex_data[:, 3:6]))
             me.use_auto_smooth = True
 
-            # set up uv layer
+            # set up uv layer, every loop takes the uv of its vertex
+            uvs = flip_axes_array(lod.vertex_data[:, 6:8]).astype(np.float32)
             uv_layer = me.uv_layers.new(do_init=False)
-            for poly in me.polygons:
-                for loop_index in range(poly.loop_start, poly.loop_start + poly.loop_total):
-                    vertex_index = me.loops[loop_index].vertex_index
-                    uv_layer.data[loop_index].uv = lod.uvs[vertex_index]
+            uv_layer.data.foreach_set('uv', uvs[loop_vertices].ravel())
 
+            # one slot per distinct material id in order of first use, face groups sharing a material share the slot
             slot_dict = {}  # maps material_id to slot_id
-            for slot_id, face_group in enumerate(lod.face_groups):
-                bpy.ops.object.material_slot_add({"object": obj})
+            for face_group in lod.face_groups:
                 material_id = face_group.material_id
-                slot_dict[material_id] = slot_id
-                material_slot = obj.material_slots[slot_id]
-                material_slot.material = self.materials[material_id - 1]
+                if material_id not in slot_dict:
+                    slot_dict[material_id] = len(me.materials)
+                    me.materials.append(self.materials[material_id - 1] if material_id > 0 else None)
 
-            for face, material_id in zip(me.polygons, material_ids):
-                face.material_index = slot_dict[material_id]
+            # polygons follow the face groups in order
+            face_slots = [slot_dict[face_group.material_id] for face_group in lod.face_groups]
+            face_counts = [len(face_group.indices) for face_group in lod.face_groups]
+            me.polygons.foreach_set('material_index', np.repeat(face_slots, face_counts).astype(np.int32))
 
             # set up blender vertex groups
             # vertex groups defined in a 4ds file are always disjoint
             # this means that each vertex can be influenced by only one bone
             # keep this in mind when creating in-game models
-            vertex_groups = node.frame.object.vertex_groups
-            if vertex_groups:
+            skins = node.frame.object.skins
+            if skins:
+                skin = skins[lod_id]
+
                 # bone nodes indexed by bone id
                 bone_nodes = dict((node.frame.id, node) for node in self.fo.nodes if node.type == 10)
-                num_bones = len(bone_nodes)
-                lod_vertex_groups = vertex_groups[lod_id * num_bones:(lod_id + 1) * num_bones]
 
-                vertex_counter = 0
-                for bone_id, vertex_group in enumerate(lod_vertex_groups):
+                for bone_id in range(len(skin.vertex_groups)):
                     bone_node = bone_nodes[bone_id]
                     bvg = obj.vertex_groups.new(name=bone_node.name)
 
-                    # first set all locked vertices to weight 1
-                    locked_vertices = list(range(vertex_counter, vertex_group.num_locked_vertices +
-                                                 + vertex_counter))
-                    vertex_counter += vertex_group.num_locked_vertices
-                    bvg.add(locked_vertices, 1.0, 'ADD')
-
-                    # then add correct weights to the rest
+                    # add the vertices of the bone in one call per distinct weight,
+                    # locked vertices all share weight 1
                     # todo: add proper overlapping
-                    weighted_vertices = list(range(vertex_counter, vertex_counter + len(vertex_group.weights)))
-                    vertex_counter += len(vertex_group.weights)
-                    for i, w in zip(weighted_vertices, vertex_group.weights):
-                        bvg.add((i,), w, 'REPLACE')
+                    bone_vertices = np.flatnonzero(skin.bone_indices == bone_id)
+                    bone_weights = skin.weights[bone_vertices]
+                    order = np.argsort(bone_weights, kind='stable')
+                    weights, starts = np.unique(bone_weights[order], return_index=True)
+                    for weight, vertices in zip(weights.tolist(), np.split(bone_vertices[order], starts[1:])):
+                        bvg.add(vertices.tolist(), weight, 'REPLACE')
 
                 # lock remaining vertices to the base bone
                 base_vg = obj.vertex_groups.new(name='base')
-                base_vertices = list(range(vertex_counter, len(lod.vertices)))
+                base_vertices = np.flatnonzero(skin.bone_indices < 0).tolist()
                 base_vg.add(base_vertices, 1.0, 'ADD')
 
             # hide secondary lods
@@ -357,9 +409,9 @@ class FourDSImporter:
         self.object_map[node.name] = objs
 
     def import_file(self):
-        with open(self.filepath, "rb") as f:
-            self.fo = FourDS.FourDSFile()
-            self.fo.read(f)
+        self.fo = FourDS.FourDSFile()
+        self.fo.read(BufferReader.from_file(self.filepath))
+        validate_4ds.check(self.fo)
 
         # create and link collections
         filename = os.path.basename(self.filepath)
@@ -369,7 +421,7 @@ class FourDSImporter:
         self.file_collection.children.link(self.dummy_collection)
 
         # load materials and handle nodes
-        self.materials = [blen_create_material(mo) for mo in self.fo.materials]
+        self.materials = [blen_get_material(mo) for mo in self.fo.materials]
         for node in self.fo.nodes:
             self.handle_node(node)
 
@@ -423,7 +475,7 @@ class Mafia4ds_ImportDialog(types.Operator, io_utils.ImportHelper):
             importer.import_file()
         except ValueError as ve:
             print(ve)
-            ShowError(ve)
+            ShowError(str(ve))
             return {'CANCELLED'}
 
         return {'FINISHED'}
@@ -1,5 +1,31 @@
+import io
+
+import numpy as np
+
 from . io_helper import *
 
+
+class Deferred:  # record whose deferred_attributes are decoded from the file on first access
+    deferred_attributes = ()
+
+    def defer(self, reader, *args):  # call at the start of the deferred data, before skipping it
+        for name in self.deferred_attributes:
+            self.__dict__.pop(name, None)
+        self._source = (BufferReader(reader.buffer, reader.tell()),) + args
+
+    def read_deferred(self, reader, *args):
+        raise NotImplementedError()
+
+    def __getattr__(self, name):  # only reached while a deferred attribute is still missing
+        source = self.__dict__.get('_source')
+        if source is None or name not in self.deferred_attributes:
+            raise AttributeError("'{}' object has no attribute '{}'".format(type(self).__name__, name))
+
+        del self._source
+        self.read_deferred(*source)
+        return getattr(self, name)
+
+
 class MatProps:
     def __init__(self, flags):
         # TODO: add detailed field description
@@ -40,6 +66,7 @@ class Material:
         self.has_effect = None
         self.alpha_texture = None
         self.environment_texture = None
+        self.texture_names = {}  # lowercase texture name to its spelling in the file, written back unchanged
         self.animated_frames = None
         self.animated_frames_length = None
         self.unknown1 = None
@@ -49,28 +76,29 @@ class Material:
         self.flags = read_uint(reader)
         self.matProps = MatProps(self.flags)  # TODO: move to mafia_4ds_import.py
 
-        self.ambient_color = read_triplet(reader)
-        self.diffuse_color = read_triplet(reader)
-        self.emission_color = read_triplet(reader)
-        self.alpha = read_float(reader)
+        colors = read_struct(reader, COLORS)
+        self.ambient_color = colors[0:3]
+        self.diffuse_color = colors[3:6]
+        self.emission_color = colors[6:9]
+        self.alpha = colors[9]
 
         # env mapping
         if (self.flags & 0x00080000) != 0:  # UseEnvTexture
             self.metallic = read_float(reader)
-            self.environment_texture = read_string(reader).lower()  # todo: find out whether .lower() is redundant
+            self.environment_texture = self.read_texture_name(reader)  # todo: find out whether .lower() is redundant
             #self.matProps.envTexture = read_string(reader).lower()
         else:
             self.metallic = 0.0
 
         # diffuse mapping
-        self.diffuse_texture = read_string(reader).lower()
+        self.diffuse_texture = self.read_texture_name(reader)
         self.has_effect = (self.flags & 0x00008000) != 0  # AddEffect
         self.use_alpha_color = (self.flags & 0x20000000) != 0
 
         # alpha mapping
         if (self.flags & 0x40000000) != 0:  # UseAlphaTexture:
             # here corrupts data from morello.4ds
-            self.alpha_texture = read_string(reader).lower()
+            self.alpha_texture = self.read_texture_name(reader)
             #self.matProps.AlphaTexture = self.alpha_texture
 
         # animated texture
@@ -85,6 +113,33 @@ class Material:
             #self.matProps.AnimFrameLength = read_uint(reader)
             #self.matProps.unknown2 = read_ulong(reader)
 
+    def read_texture_name(self, reader):
+        name = read_string(reader)
+        self.texture_names[name.lower()] = name
+        return name.lower()
+
+    def write_texture_name(self, writer, name):
+        write_string(writer, self.texture_names.get(name, name))
+
+    def write(self, writer):
+        write_uint(writer, self.flags)
+        write_struct(writer, COLORS, *self.ambient_color, *self.diffuse_color, *self.emission_color, self.alpha)
+
+        if (self.flags & 0x00080000) != 0:  # UseEnvTexture
+            write_float(writer, self.metallic)
+            self.write_texture_name(writer, self.environment_texture)
+
+        self.write_texture_name(writer, self.diffuse_texture)
+
+        if (self.flags & 0x40000000) != 0:  # UseAlphaTexture
+            self.write_texture_name(writer, self.alpha_texture)
+
+        if (self.flags & 0x04000000) != 0:  # AnimatedDiffuse
+            write_uint(writer, self.animated_frames)
+            write_ushort(writer, self.unknown1)
+            write_uint(writer, self.animated_frames_length)
+            write_ulong(writer, self.unknown2)
+
 
 class Dummy:
     def __init__(self):
@@ -96,7 +151,8 @@ class Dummy:
         self.max = read_triplet(reader)
 
     def write(self, writer):
-        raise NotImplementedError()
+        write_triplet(writer, self.min)
+        write_triplet(writer, self.max)
 
 
 class Bone:
@@ -109,7 +165,8 @@ class Bone:
         self.id = read_uint(reader)
 
     def write(self, writer):
-        raise NotImplementedError()
+        write_matrix(writer, self.matrix)
+        write_uint(writer, self.id)
 
 
 class Target:
@@ -123,7 +180,9 @@ class Target:
         self.links = [read_ushort(reader) for _ in range(num_links)]
 
     def write(self, writer):
-        raise NotImplementedError()
+        write_ushort(writer, self.flags)
+        write_ubyte(writer, len(self.links))
+        write_array(writer, self.links, '<u2')
 
 
 frame_types = {  # visual frame handled separately
@@ -133,65 +192,228 @@ frame_types = {  # visual frame handled separately
 }
 
 
-class FaceGroup:
+class FaceGroup(Deferred):
+    deferred_attributes = ('indices',)
+
     def __init__(self):
+        self.offset = None
         self.material_id = None
-        self.faces = None
-
-    def read(self, reader):
+        self.indices = None  # (num_faces, 3) uint16 array
+
+    @property
+    def faces(self):  # read-only snapshot of indices as index tuples, kept for compatibility, assign to change
+        # built once per indices array, edit indices by assigning a new array (or faces), not in place
+        cached_indices, faces = self.__dict__.get('_faces', (None, None))
+        if cached_indices is not self.indices:
+            faces = tuple(map(tuple, self.indices.tolist()))
+            self._faces = (self.indices, faces)
+        return faces
+
+    @faces.setter
+    def faces(self, faces):
+        self.indices = np.array(faces, dtype=np.uint16).reshape(-1, 3)
+
+    def read(self, reader, lazy=False):
+        self.offset = reader.tell()
         numFaces = read_ushort(reader)
-        self.faces = []
-        for faceId in range(numFaces):
-            face = tuple(read_ushort(reader) for _ in range(3))
-            self.faces.append(face)
+        if lazy:
+            self.defer(reader, numFaces)
+            reader.seek(numFaces * 6, 1)
+        else:
+            self.read_deferred(reader, numFaces)
 
         self.material_id = read_ushort(reader)
 
+    def read_deferred(self, reader, numFaces):
+        self.indices = read_array(reader, '<u2', numFaces * 3).reshape(numFaces, 3)
+
     def write(self, writer):
-        raise NotImplementedError()
+        write_ushort(writer, len(self.indices))
+        write_array(writer, self.indices, '<u2')
+        write_ushort(writer, self.material_id)
 
 
-class Lod:  # level of detail
+class Lod(Deferred):  # level of detail
+    deferred_attributes = ('vertex_data',)
+
     def __init__(self):
+        self.offset = None
         self.clipping_range = None
-        self.vertices = None
-        self.normals = None
-        self.uvs = None
+        self.num_vertices = None
+        self.vertex_data = None  # (num_vertices, 8) float32 array of vertex, normal and uv in file axes
         self.face_groups = None
 
-    def read(self, reader):
+    def read(self, reader, lazy=False):
+        self.offset = reader.tell()
         self.clipping_range = read_float(reader)
-        num_vertices = read_ushort(reader)
-
-        self.vertices = []
-        self.normals = []
-        self.uvs = []
-        for _ in range(num_vertices):
-            vertex = read_triplet(reader)
-            normal = read_triplet(reader)
-            uv = read_doublet(reader)
-
-            vertex = flip_axes(vertex)
-            normal = flip_axes(normal)
-            uv = flip_axes(uv)
+        self.num_vertices = read_ushort(reader)
 
-            self.vertices.append(vertex)
-            self.normals.append(normal)
-            self.uvs.append(uv)
+        if lazy:
+            self.defer(reader)
+            reader.seek(self.num_vertices * 32, 1)
+        else:
+            self.read_deferred(reader)
 
         self.face_groups = []
         num_face_groups = read_ubyte(reader)
         for faceGroupIdx in range(num_face_groups):
             face_group = FaceGroup()
-            face_group.read(reader)
+            face_group.read(reader, lazy)
             self.face_groups.append(face_group)
 
+    def read_deferred(self, reader):
+        num_vertices = self.num_vertices
+
+        # interleaved block of vertex (3f), normal (3f) and uv (2f) in file axes
+        self.vertex_data = read_array(reader, '<f4', num_vertices * 8).reshape(num_vertices, 8)
+
+    # compatibility views of vertex_data in blender axes, read-only snapshots of tuples, assign to change
+    # built once per vertex_data array, edit vertex_data by assigning a new array (or the lists), not in place
+    @property
+    def vertices(self):
+        return self.get_columns(0, 3)
+
+    @vertices.setter
+    def vertices(self, vertices):
+        self.set_columns(0, 3, vertices)
+
+    @property
+    def normals(self):
+        return self.get_columns(3, 6)
+
+    @normals.setter
+    def normals(self, normals):
+        self.set_columns(3, 6, normals)
+
+    @property
+    def uvs(self):
+        return self.get_columns(6, 8)
+
+    @uvs.setter
+    def uvs(self, uvs):
+        self.set_columns(6, 8, uvs)
+
+    def get_columns(self, start, stop):
+        vertex_data = self.vertex_data
+        if vertex_data is None:
+            return None
+
+        cached_data, snapshots = self.__dict__.get('_snapshots', (None, None))
+        if cached_data is not vertex_data:
+            snapshots = {}
+            self._snapshots = (vertex_data, snapshots)
+
+        if start not in snapshots:
+            snapshots[start] = tuple(map(tuple, flip_axes_array(vertex_data[:, start:stop]).tolist()))
+        return snapshots[start]
+
+    def set_columns(self, start, stop, values):
+        values = np.asarray(values, dtype=np.float64).reshape(-1, stop - start)
+        if self.vertex_data is None or len(self.vertex_data) != len(values):
+            self.vertex_data = np.zeros((len(values), 8), dtype=np.float32)  # other columns have to be set too
+            self.num_vertices = len(values)
+
+        self.vertex_data[:, start:stop] = flip_axes_array(values)  # flip_axes is its own inverse
+        self.__dict__.pop('_snapshots', None)
+
     def write(self, writer):
-        raise NotImplementedError()
+        write_float(writer, self.clipping_range)
+        write_ushort(writer, len(self.vertex_data))
+        write_array(writer, self.vertex_data, '<f4')
+
+        write_ubyte(writer, len(self.face_groups))
+        for face_group in self.face_groups:
+            face_group.write(writer)
+
+
+class MorphRegion:  # vertices of one lod moved by the morph targets
+    def __init__(self):
+        self.positions = None  # (num_targets, num_vertices, 3) float32 array per target
+        self.normals = None  # (num_targets, num_vertices, 3) float32 array per target
+        self.indices_flag = None  # only present with targets and vertices, 0 means no vertex indices
+        self.vertex_indices = None  # (num_vertices,) uint16 array of lod vertex ids
+
+    def read(self, reader, num_targets):
+        num_vertices = read_ushort(reader)
+
+        # per vertex and target: position (3f), normal (3f) in file axes
+        data = read_array(reader, '<f4', num_vertices * num_targets * 6).reshape(num_vertices, num_targets, 6)
+        data = data.transpose(1, 0, 2)
+        self.positions = flip_axes_array(data[..., 0:3])
+        self.normals = flip_axes_array(data[..., 3:6])
+
+        if num_targets * num_vertices > 0:
+            self.indices_flag = read_ubyte(reader)
+
+            if self.indices_flag == 0:
+                return
+
+        self.vertex_indices = read_array(reader, '<u2', num_vertices)
+
+    def write(self, writer, num_targets):
+        num_vertices = self.positions.shape[1]
+        write_ushort(writer, num_vertices)
+
+        data = np.concatenate((flip_axes_array(self.positions), flip_axes_array(self.normals)), axis=-1)
+        write_array(writer, data.transpose(1, 0, 2), '<f4')
+
+        if num_targets * num_vertices > 0:
+            write_ubyte(writer, self.indices_flag)
+
+            if self.indices_flag == 0:
+                return
+
+        write_array(writer, self.vertex_indices, '<u2')
 
 
 class ShapeKeys:
+    def __init__(self):
+        self.num_targets = 0
+        self.regions = []  # indexed by lod id, then region id
+        self.dmin = None
+        self.dmax = None
+        self.origin = None
+        self.radius = None
+
     def read(self, reader):
+        self.num_targets = read_ubyte(reader)
+
+        if self.num_targets > 0:
+            numRegions = read_ubyte(reader)
+            num_lods = read_ubyte(reader)
+
+            for lodId in range(num_lods):
+                lod_regions = []
+                for regionIdx in range(numRegions):
+                    region = MorphRegion()
+                    region.read(reader, self.num_targets)
+                    lod_regions.append(region)
+
+                self.regions.append(lod_regions)
+
+            self.dmin = read_triplet(reader)
+            self.dmax = read_triplet(reader)
+            self.origin = read_triplet(reader)
+            self.radius = read_float(reader)
+
+    def write(self, writer):
+        write_ubyte(writer, self.num_targets)
+
+        if self.num_targets > 0:
+            write_ubyte(writer, len(self.regions[0]))
+            write_ubyte(writer, len(self.regions))
+
+            for lod_regions in self.regions:
+                for region in lod_regions:
+                    region.write(writer, self.num_targets)
+
+            write_triplet(writer, self.dmin)
+            write_triplet(writer, self.dmax)
+            write_triplet(writer, self.origin)
+            write_float(writer, self.radius)
+
+    @staticmethod
+    def skip(reader):
         numTargets = read_ubyte(reader)
 
         if numTargets > 0:
@@ -201,11 +423,7 @@ class ShapeKeys:
             for lodId in range(num_lods):
                 for regionIdx in range(numRegions):
                     num_vertices = read_ushort(reader)
-
-                    for vertId in range(num_vertices):
-                        for targetIdx in range(numTargets):
-                            coord = read_triplet(reader)
-                            normal = read_triplet(reader)
+                    reader.seek(num_vertices * numTargets * 24, 1)
 
                     if numTargets * num_vertices > 0:
                         unknown1 = read_ubyte(reader)
@@ -213,13 +431,9 @@ class ShapeKeys:
                         if unknown1 == 0:
                             continue
 
-                    for vertId in range(num_vertices):
-                        _ = read_ushort(reader)
+                    reader.seek(num_vertices * 2, 1)
 
-            dmin = read_triplet(reader)
-            dmax = read_triplet(reader)
-            origin = read_triplet(reader)
-            radius = read_float(reader)
+            reader.seek(10 * 4, 1)  # bounds, origin and radius
 
 
 class VertexGroup:
@@ -233,20 +447,96 @@ class VertexGroup:
         self.weights = None
 
     def read(self, reader):
-        self.matrix = read_matrix(reader)
+        header = read_struct(reader, VERTEX_GROUP_HEADER)
+        self.matrix = matrix_from_floats(header[0:16])
+
+        self.num_locked_vertices = header[16]  # vertices with weight 1
+        self.num_weighted_vertices = header[17]
 
-        self.num_locked_vertices = read_uint(reader)  # vertices with weight 1
-        self.num_weighted_vertices = read_uint(reader)
+        self.parent_id = header[18]
 
-        self.parent_id = read_uint(reader)
+        self.dmin = header[19:22]
+        self.dmax = header[22:25]
+
+        self.weights = read_array(reader, '<f4', self.num_weighted_vertices)
+
+    def write(self, writer):
+        write_struct(writer, VERTEX_GROUP_HEADER, *matrix_to_floats(self.matrix),
+                     self.num_locked_vertices, len(self.weights), self.parent_id, *self.dmin, *self.dmax)
+        write_array(writer, self.weights, '<f4')
+
+    @staticmethod
+    def skip(reader):
+        header = read_struct(reader, VERTEX_GROUP_HEADER)
+        reader.seek(header[17] * 4, 1)
+
+
+class Skin:  # skinning of one lod
+    def __init__(self):
+        self.num_locked_vertices = None
+        self.dmin = None
+        self.dmax = None
+        self.vertex_groups = []  # indexed by bone id
+        # read-only per-vertex views of vertex_groups, write ignores them, edit vertex_groups
+        # and call build_vertex_arrays to refresh the views
+        self.bone_indices = None  # (num_vertices,) int16 array, -1 for vertices left to the base bone
+        self.weights = None  # (num_vertices,) float32 array
+
+    def read(self, reader, num_vertices):
+        num_bones = read_ubyte(reader)
+        self.num_locked_vertices = read_uint(reader)  # ???
 
         self.dmin = read_triplet(reader)
         self.dmax = read_triplet(reader)
 
-        self.weights = [read_float(reader) for _ in range(self.num_weighted_vertices)]
+        for bone_id in range(num_bones):
+            vertex_group = VertexGroup()
+            vertex_group.read(reader)
+            self.vertex_groups.append(vertex_group)
+
+        self.build_vertex_arrays(num_vertices)
+
+    def write(self, writer):
+        write_ubyte(writer, len(self.vertex_groups))
+        write_uint(writer, self.num_locked_vertices)
+
+        write_triplet(writer, self.dmin)
+        write_triplet(writer, self.dmax)
+
+        for vertex_group in self.vertex_groups:
+            vertex_group.write(writer)
+
+    def build_vertex_arrays(self, num_vertices):
+        # vertex groups cover consecutive ranges of lod vertices in bone order,
+        # first the locked vertices of a bone (weight 1), then its weighted ones
+        num_bones = len(self.vertex_groups)
+        # groups running past the lod vertices are cut off here, validate_4ds reports them
+        counts = [count for vg in self.vertex_groups for count in (vg.num_locked_vertices, vg.num_weighted_vertices)]
+        num_covered = min(sum(counts), num_vertices)
+
+        self.bone_indices = np.full(num_vertices, -1, dtype=np.int16)
+        self.bone_indices[:num_covered] = np.repeat(np.repeat(np.arange(num_bones), 2), counts)[:num_covered]
 
+        self.weights = np.ones(num_vertices, dtype=np.float32)
+        if num_bones > 0:
+            is_weighted = np.repeat(np.tile((False, True), num_bones), counts)[:num_covered]
+            weights = np.concatenate([vg.weights for vg in self.vertex_groups])
+            self.weights[:num_covered][is_weighted] = weights[:np.count_nonzero(is_weighted)]
+
+        self.bone_indices.setflags(write=False)
+        self.weights.setflags(write=False)
+
+    @staticmethod
+    def skip(reader):
+        num_bones = read_ubyte(reader)
+        reader.seek(4 + 6 * 4, 1)
+        for bone_id in range(num_bones):
+            VertexGroup.skip(reader)
+
+
+class Mesh(Deferred):
+    deferred_attributes = ('skins', 'vertex_groups', 'shape_keys', 'dmin', 'dmax')
 
-class Mesh:
     def __init__(self, weights=False, shape_keys=False, billboard=False):
         self.instance_id = None
         self.has_weights = weights
@@ -255,12 +545,13 @@ class Mesh:
 
         self.lods = []
         self.armature = None
-        self.vertex_groups = []  # indexed by lod id
+        self.skins = []  # indexed by lod id
+        self.vertex_groups = []  # of all lods, in lod order
         self.shape_keys = None
         self.dmin = None
         self.dmax = None
 
-    def read(self, reader):
+    def read(self, reader, lazy=False):
         self.instance_id = read_ushort(reader)
         if self.instance_id > 0:
             return
@@ -271,29 +562,54 @@ class Mesh:
                 pass
 
             lod = Lod()
-            lod.read(reader)
+            lod.read(reader, lazy)
             self.lods.append(lod)
 
-        if self.has_weights:
-            for lod_id in range(num_lods):
-                lodMeshBones = []
-                num_bones = read_ubyte(reader)
-                numLockedVerticesAll = read_uint(reader)  # ???
+        if lazy and (self.has_weights or self.has_shape_keys):
+            self.defer(reader)
+
+            if self.has_weights:
+                for lod_id in range(num_lods):
+                    Skin.skip(reader)
+
+            if self.has_shape_keys:
+                ShapeKeys.skip(reader)
+        else:
+            self.read_deferred(reader)
 
-                self.dmin = read_triplet(reader)
-                self.dmax = read_triplet(reader)
+    def read_deferred(self, reader):  # skinning and morphs following the lods
+        self.skins = []
+        self.vertex_groups = []
+        if self.has_weights:
+            for lod in self.lods:
+                skin = Skin()
+                skin.read(reader, lod.num_vertices)
+                self.skins.append(skin)
+                self.vertex_groups.extend(skin.vertex_groups)
 
-                for bone_id in range(num_bones):
-                    vertex_group = VertexGroup()
-                    vertex_group.read(reader)
-                    self.vertex_groups.append(vertex_group)
+                self.dmin = skin.dmin
+                self.dmax = skin.dmax
 
+        self.shape_keys = None
         if self.has_shape_keys:
             self.shape_keys = ShapeKeys()
             self.shape_keys.read(reader)
 
     def write(self, writer):
-        raise NotImplementedError()
+        write_ushort(writer, self.instance_id)
+        if self.instance_id > 0:
+            return
+
+        write_ubyte(writer, len(self.lods))
+        for lod in self.lods:
+            lod.write(writer)
+
+        if self.has_weights:
+            for skin in self.skins:
+                skin.write(writer)
+
+        if self.has_shape_keys:
+            self.shape_keys.write(writer)
 
 
 class VisualFrame:
@@ -302,7 +618,7 @@ class VisualFrame:
         self.render_flags = render_flags
         self.object = None
 
-    def read(self, reader):
+    def read(self, reader, lazy=False):
         if self.visual_type == 0x00 or self.visual_type == 0x01:
             self.object = Mesh(weights=False, shape_keys=False, billboard=False)
         elif self.visual_type == 0x02:
@@ -314,14 +630,15 @@ class VisualFrame:
         else:
             raise ValueError('Unknown visual type {}.'.format(self.visual_type))
 
-        self.object.read(reader)
+        self.object.read(reader, lazy)
 
     def write(self, writer):
-        raise NotImplementedError()
+        self.object.write(writer)
 
 
 class Node:
     def __init__(self):
+        self.offset = None
         self.frame = None
         self.parent_id = None
         self.parameters = None
@@ -332,7 +649,8 @@ class Node:
         self.location = None
         self.type = None
 
-    def read(self, reader):
+    def read(self, reader, lazy=False):
+        self.offset = reader.tell()
         self.type = read_ubyte(reader)
         if self.type == 0x01:  # visual frame
             visual_type = read_ubyte(reader)
@@ -340,13 +658,10 @@ class Node:
 
         self.parent_id = read_ushort(reader)
 
-        self.location = read_triplet(reader)
-        self.scale = read_triplet(reader)
-        self.rotation = read_quartet(reader)
-
-        self.location = flip_axes(self.location)
-        self.scale = flip_axes(self.scale)
-        self.rotation = flip_axes(self.rotation)
+        transform = read_struct(reader, TRANSFORM)
+        self.location = flip_axes(transform[0:3])
+        self.scale = flip_axes(transform[3:6])
+        self.rotation = flip_axes(transform[6:10])
 
         self.culling_flags = read_ubyte(reader)
         self.name = read_string(reader)
@@ -354,7 +669,7 @@ class Node:
 
         if self.type == 0x01:
             self.frame = VisualFrame(visual_type, render_flags)
-            self.frame.read(reader)
+            self.frame.read(reader, lazy)
         else:
             if self.type not in frame_types:
                 raise NotImplementedError('Not implemented frame type {}'.format(self.type))
@@ -363,18 +678,47 @@ class Node:
             self.frame.read(reader)
 
     def write(self, writer):
-        raise NotImplementedError()
+        write_ubyte(writer, self.type)
+        if self.type == 0x01:  # visual frame
+            write_ubyte(writer, self.frame.visual_type)
+            write_ushort(writer, self.frame.render_flags)
+
+        write_ushort(writer, self.parent_id)
+
+        write_struct(writer, TRANSFORM, *flip_axes(self.location), *flip_axes(self.scale), *flip_axes(self.rotation))
+
+        write_ubyte(writer, self.culling_flags)
+        write_string(writer, self.name)
+        write_string(writer, self.parameters)
+
+        self.frame.write(writer)
 
 
 class FourDSFile:
     def __init__(self):
         self.version = None
         self.timestamp = None
+        self.is_animated = None  # trailing byte allowing 5ds animation, set once the nodes are read
 
         self.materials = []
         self.nodes = []
 
-    def read(self, reader):
+    def read(self, reader, lazy=False):  # lazy only indexes the geometry, decoding it on first access
+        items = iter_4ds(reader, lazy)
+
+        header = next(items)
+        self.version = header.version
+        self.timestamp = header.timestamp
+
+        for item in items:
+            if isinstance(item, Material):
+                self.materials.append(item)
+            else:
+                self.nodes.append(item)
+
+        self.is_animated = header.is_animated
+
+    def read_header(self, reader):
         fourcc = read_string_fixed(reader, 4)
         if fourcc != '4DS\0':
             raise ValueError("Not a 4ds file.")
@@ -385,17 +729,49 @@ class FourDSFile:
 
         self.timestamp = read_ulong(reader)
 
-        numMaterials = read_ushort(reader)
-        for material_idx in range(numMaterials):
-            material = Material()
-            material.read(reader)
-            self.materials.append(material)
+    def write(self, writer):  # the whole file is serialized in memory and written at once
+        buffer = io.BytesIO()
 
-        num_nodes = read_ushort(reader)
-        for idx in range(num_nodes):
-            node = Node()
-            node.read(reader)
-            self.nodes.append(node)
+        write_string_fixed(buffer, '4DS\0')
+        write_ushort(buffer, self.version)
+        write_ulong(buffer, self.timestamp)
 
-    def write(self, writer):
-        raise NotImplementedError()
+        write_ushort(buffer, len(self.materials))
+        for material in self.materials:
+            material.write(buffer)
+
+        write_ushort(buffer, len(self.nodes))
+        for node in self.nodes:
+            node.write(buffer)
+
+        if self.is_animated is not None:
+            write_ubyte(buffer, self.is_animated)
+
+        writer.write(buffer.getbuffer())
+
+
+def iter_4ds(reader, lazy=False):
+    # streams the file: yields the header (a FourDSFile without materials and nodes),
+    # then every Material and Node as soon as it's parsed, without holding on to them
+    if lazy and not isinstance(reader, BufferReader):
+        reader = BufferReader(reader.read())  # deferred records need the data after reading
+
+    header = FourDSFile()
+    header.read_header(reader)
+    yield header
+
+    numMaterials = read_ushort(reader)
+    for material_idx in range(numMaterials):
+        material = Material()
+        material.read(reader)
+        yield material
+
+    num_nodes = read_ushort(reader)
+    for idx in range(num_nodes):
+        node = Node()
+        node.read(reader, lazy)
+        yield node
+
+    is_animated = reader.read(1)  # missing in some files
+    if len(is_animated) > 0:
+        header.is_animated = is_animated[0]
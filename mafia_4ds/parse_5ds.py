@@ -1,3 +1,8 @@
+import io
+from collections.abc import Sequence
+
+import numpy as np
+
 from . io_helper import *
 
 
@@ -7,21 +12,55 @@ KEY_SCALE = 8
 KEY_UNKNOWN = 16
 
 
+def read_track(reader, width, padded):  # frame numbers and keys of width floats, decoded in one read
+    num_frames = read_ushort(reader)
+    frames_size = num_frames * 2
+    if padded and num_frames % 2 == 0:  # frame numbers padded to 4 bytes, counting the frame count
+        frames_size += 2
+
+    data = reader.read(frames_size + num_frames * width * 4)
+    frames = np.frombuffer(data, '<u2', num_frames).astype(np.uint16)
+    keys = np.frombuffer(data, '<f4', num_frames * width, frames_size).astype(np.float32)
+
+    padding = None
+    if frames_size > num_frames * 2:
+        padding = USHORT.unpack_from(data, num_frames * 2)[0]
+
+    return frames, keys.reshape(num_frames, width), padding
+
+
+def write_track(writer, frames, keys, padded, padding=None):  # the whole track packed at once
+    num_frames = len(frames)
+    write_ushort(writer, num_frames)
+
+    data = np.ascontiguousarray(frames, '<u2').tobytes()
+    if padded and num_frames % 2 == 0:
+        data += USHORT.pack(padding or 0)
+
+    writer.write(data + np.ascontiguousarray(keys, '<f4').tobytes())
+
+
 class BoneAnimation:
     def __init__(self):
+        self.flags = None
         self.has_unknown = None
         self.has_scale = None
         self.has_rotation = None
         self.has_position = None
+        # frames are (num_keys,) uint16 arrays, keys (num_keys, 4) and (num_keys, 3) float32 arrays
         self.scale_keys = None
         self.scale_frames = None
         self.position_keys = None
         self.position_frames = None
         self.rotation_keys = None
         self.rotation_frames = None
+        self.position_padding = None  # values of the padding words, kept to write the file back
+        self.scale_padding = None
+        self.unknown_value = None
+        self.unknown_keys = None
 
     def read(self, reader):
-        flags = read_uint(reader)
+        self.flags = flags = read_uint(reader)
 
         self.has_position = (flags & KEY_POSITION) != 0
         self.has_rotation = (flags & KEY_ROTATION) != 0
@@ -29,37 +68,60 @@ class BoneAnimation:
         self.has_unknown = (flags & KEY_UNKNOWN) != 0
 
         if self.has_rotation:
-            num_rotation_frames = read_ushort(reader)
-            self.rotation_frames = [read_ushort(reader) for _ in range(num_rotation_frames)]
-            self.rotation_keys = [read_quartet(reader) for _ in range(num_rotation_frames)]
+            self.rotation_frames, self.rotation_keys, _ = read_track(reader, 4, padded=False)
 
         if self.has_position:
-            num_position_frames = read_ushort(reader)
-            self.position_frames = [read_ushort(reader) for _ in range(num_position_frames)]
+            self.position_frames, self.position_keys, self.position_padding = read_track(reader, 3, padded=True)
+            self.position_keys = flip_axes_array(self.position_keys)
 
-            if num_position_frames % 2 == 0:
-                read_ushort(reader)
+        if self.has_scale:
+            self.scale_frames, self.scale_keys, self.scale_padding = read_track(reader, 3, padded=True)
 
-            self.position_keys = [flip_axes(read_triplet(reader)) for _ in range(num_position_frames)]
+        if self.has_unknown:
+            num_unknown_frames = read_ushort(reader)
+            self.unknown_value = read_ushort(reader)
+            self.unknown_keys = read_array(reader, '<u4', num_unknown_frames)
 
-        if self.has_scale:
-            num_scale_frames = read_ushort(reader)
-            self.scale_frames = [read_ushort(reader) for _ in range(num_scale_frames)]
+    @staticmethod
+    def skip(reader):
+        flags = read_uint(reader)
 
-            if num_scale_frames % 2 == 0:
-                read_ushort(reader)
+        if (flags & KEY_ROTATION) != 0:
+            num_rotation_frames = read_ushort(reader)
+            reader.seek(num_rotation_frames * (2 + 4 * 4), 1)
 
-            self.scale_keys = [read_triplet(reader) for _ in range(num_scale_frames)]
+        for key in (KEY_POSITION, KEY_SCALE):
+            if (flags & key) != 0:
+                num_frames = read_ushort(reader)
+                padding = 2 if num_frames % 2 == 0 else 0
+                reader.seek(num_frames * (2 + 3 * 4) + padding, 1)
 
-        if self.has_unknown:
+        if (flags & KEY_UNKNOWN) != 0:
             num_unknown_frames = read_ushort(reader)
-            read_ushort(reader)
-
-            for _ in range(num_unknown_frames):
-                read_uint(reader)
+            reader.seek(2 + num_unknown_frames * 4, 1)
 
     def write(self, writer):
-        raise NotImplementedError()
+        flags = (self.flags or 0) & ~(KEY_POSITION | KEY_ROTATION | KEY_SCALE | KEY_UNKNOWN)
+        flags |= KEY_POSITION if self.has_position else 0
+        flags |= KEY_ROTATION if self.has_rotation else 0
+        flags |= KEY_SCALE if self.has_scale else 0
+        flags |= KEY_UNKNOWN if self.has_unknown else 0
+        write_uint(writer, flags)
+
+        if self.has_rotation:
+            write_track(writer, self.rotation_frames, self.rotation_keys, padded=False)
+
+        if self.has_position:
+            write_track(writer, self.position_frames, flip_axes_array(np.asarray(self.position_keys)),
+                        padded=True, padding=self.position_padding)
+
+        if self.has_scale:
+            write_track(writer, self.scale_frames, self.scale_keys, padded=True, padding=self.scale_padding)
+
+        if self.has_unknown:
+            write_ushort(writer, len(self.unknown_keys))
+            write_ushort(writer, self.unknown_value)
+            write_array(writer, self.unknown_keys, '<u4')
 
 
 class FiveDSFile:
@@ -73,6 +135,18 @@ class FiveDSFile:
         self.bone_names = None
 
     def read(self, reader):
+        num_bones = self.read_header(reader)
+
+        self.bone_animations = []
+        for _ in range(num_bones):
+            anim = BoneAnimation()
+            anim.read(reader)
+            self.bone_animations.append(anim)
+
+        self.bone_names = read_string_array(reader)
+        assert len(self.bone_names) == num_bones
+
+    def read_header(self, reader):
         magic = read_string_fixed(reader, 4)
         if magic != '5DS\0':
             raise ValueError("Not a 5ds file.")
@@ -88,15 +162,79 @@ class FiveDSFile:
         self.num_frames = read_ushort(reader)
 
         self.links = [(read_uint(reader), read_uint(reader)) for _ in range(num_bones)]
+        return num_bones
 
-        self.bone_animations = []
-        for _ in range(num_bones):
+    def write(self, writer):  # the whole file is serialized in memory and written at once
+        buffer = io.BytesIO()
+
+        write_string_fixed(buffer, '5DS\0')
+        write_ushort(buffer, self.version)
+        write_ulong(buffer, self.timestamp)
+        write_uint(buffer, self.unknown_1)
+
+        write_ushort(buffer, len(self.bone_animations))
+        write_ushort(buffer, self.num_frames)
+
+        write_array(buffer, self.links, '<u4')
+
+        for anim in self.bone_animations:
+            anim.write(buffer)
+
+        for name in self.bone_names:
+            write_string_fixed(buffer, name + '\0')
+
+        writer.write(buffer.getbuffer())
+
+
+class LazyBoneAnimations(Sequence):  # bone animations of a FiveDSIndex, each decoded on first access and kept
+    def __init__(self, reader, offsets):
+        self.reader = reader
+        self.offsets = offsets  # byte offset of the animation of each bone
+        self.decoded = [None] * len(offsets)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, bone_id):
+        if isinstance(bone_id, slice):
+            return [self[i] for i in range(*bone_id.indices(len(self)))]
+
+        anim = self.decoded[bone_id]
+        if anim is None:
             anim = BoneAnimation()
-            anim.read(reader)
-            self.bone_animations.append(anim)
+            anim.read(BufferReader(self.reader.buffer, self.offsets[bone_id]))
+            self.decoded[bone_id] = anim
+
+        return anim
+
+    def __setitem__(self, bone_id, anim):
+        self.decoded[bone_id] = anim
+
+
+class FiveDSIndex(FiveDSFile):  # 5ds file decoding the tracks of single bones on demand
+    def __init__(self):
+        super().__init__()
+        self.offsets = None  # byte offset of the animation of each bone
+        self.bone_map = None  # bone name to bone index
+        self.reader = None
+
+    def read(self, reader):  # pass BufferReader.from_file() to read the tracks straight from a mapped file
+        if not isinstance(reader, BufferReader):
+            reader = BufferReader(reader.read())
+
+        num_bones = self.read_header(reader)
+
+        self.offsets = []
+        for _ in range(num_bones):
+            self.offsets.append(reader.tell())
+            BoneAnimation.skip(reader)
 
         self.bone_names = read_string_array(reader)
         assert len(self.bone_names) == num_bones
 
-    def write(self, writer):
-        raise NotImplementedError()
+        self.bone_map = dict((name, bone_id) for bone_id, name in enumerate(self.bone_names))
+        self.bone_animations = LazyBoneAnimations(reader, self.offsets)
+        self.reader = reader
+
+    def bone_animation(self, bone):  # by bone name or index
+        return self.bone_animations[self.bone_map[bone] if isinstance(bone, str) else bone]
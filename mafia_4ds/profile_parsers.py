@@ -0,0 +1,171 @@
+# section-level profiling of the 4ds and 5ds parsers
+# the read methods are wrapped only while profiling is active, so the parsers run untouched otherwise
+# usage: python -m mafia_4ds.profile_parsers <file.4ds or file.5ds> [--lazy] [--nodes N]
+#
+#   with profile_parsers.profile() as profile:
+#       fo.read(reader)
+#   print(profile.report())
+
+import argparse
+import sys
+import time
+from contextlib import contextmanager
+
+from . io_helper import BufferReader
+from . import parse_4ds as FourDS
+from . import parse_5ds as FiveDS
+
+
+SECTIONS = (  # owner, attribute, section name
+    (FourDS.FourDSFile, 'read', 'file'),
+    (FourDS.FourDSFile, 'read_header', 'header'),
+    (FourDS.Material, 'read', 'material'),
+    (FourDS.Node, 'read', 'node'),
+    (FourDS.Mesh, 'read', 'mesh'),
+    (FourDS.Mesh, 'read_deferred', 'mesh skins and morphs'),
+    (FourDS.Lod, 'read', 'lod'),
+    (FourDS.Lod, 'read_deferred', 'vertex block'),
+    (FourDS.FaceGroup, 'read', 'face group'),
+    (FourDS.FaceGroup, 'read_deferred', 'face indices'),
+    (FourDS.Skin, 'read', 'skin'),
+    (FourDS.Skin, 'skip', 'skin skip'),
+    (FourDS.VertexGroup, 'read', 'vertex group'),
+    (FourDS.ShapeKeys, 'read', 'shape keys'),
+    (FourDS.ShapeKeys, 'skip', 'shape keys skip'),
+    (FourDS.MorphRegion, 'read', 'morph region'),
+    (FourDS.Dummy, 'read', 'dummy'),
+    (FourDS.Bone, 'read', 'bone'),
+    (FourDS.Target, 'read', 'target'),
+    (FiveDS.FiveDSFile, 'read', 'file'),
+    (FiveDS.FiveDSIndex, 'read', 'file'),
+    (FiveDS.FiveDSFile, 'read_header', 'header'),
+    (FiveDS.BoneAnimation, 'read', 'bone animation'),
+    (FiveDS.BoneAnimation, 'skip', 'bone animation skip'),
+    (FiveDS, 'read_track', 'track'),
+)
+
+
+class SectionStats:
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.seconds = 0.0  # including nested sections
+        self.self_seconds = 0.0  # excluding nested sections
+        self.bytes = 0  # consumed from the reader, including nested sections
+
+
+class NodeStats:  # one per parsed node, with its geometry and skinning
+    def __init__(self, name, node_type, offset, seconds, num_bytes):
+        self.name = name
+        self.type = node_type
+        self.offset = offset
+        self.seconds = seconds
+        self.bytes = num_bytes
+
+
+class Profile:
+    def __init__(self, tracer=None):
+        self.tracer = tracer  # called as tracer(section, obj, seconds, num_bytes) after every section
+        self.sections = {}
+        self.nodes = []
+        self.stack = []  # seconds spent in nested sections, per open section
+
+    def record(self, section, obj, seconds, num_bytes):
+        stats = self.sections.get(section)
+        if stats is None:
+            stats = self.sections[section] = SectionStats(section)
+
+        nested = self.stack.pop()
+        stats.count += 1
+        stats.seconds += seconds
+        stats.self_seconds += seconds - nested
+        stats.bytes += num_bytes
+        if self.stack:
+            self.stack[-1] += seconds
+
+        if isinstance(obj, FourDS.Node):
+            self.nodes.append(NodeStats(obj.name, obj.type, obj.offset, seconds, num_bytes))
+
+        if self.tracer:
+            self.tracer(section, obj, seconds, num_bytes)
+
+    def wrap(self, function, section, reader_index):
+        def wrapper(*args, **kwargs):
+            reader = args[reader_index] if len(args) > reader_index else kwargs['reader']
+            position = reader.tell()
+            self.stack.append(0.0)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                seconds = time.perf_counter() - start
+                self.record(section, args[0] if reader_index else None, seconds, reader.tell() - position)
+
+        wrapper.__wrapped__ = function
+        return wrapper
+
+    def report(self, num_nodes=10):
+        lines = ['{:<22} {:>8} {:>11} {:>11} {:>12} {:>9}'.format(
+            'section', 'count', 'total ms', 'self ms', 'bytes', 'MB/s')]
+
+        for stats in sorted(self.sections.values(), key=lambda stats: stats.self_seconds, reverse=True):
+            speed = stats.bytes / stats.seconds / 1e6 if stats.seconds > 0 else 0.0
+            lines.append('{:<22} {:>8} {:>11.3f} {:>11.3f} {:>12} {:>9.1f}'.format(
+                stats.name, stats.count, stats.seconds * 1e3, stats.self_seconds * 1e3, stats.bytes, speed))
+
+        if self.nodes and num_nodes:
+            lines.append('')
+            lines.append('{:<32} {:>5} {:>10} {:>11} {:>12}'.format('slowest nodes', 'type', 'offset', 'ms', 'bytes'))
+            for node in sorted(self.nodes, key=lambda node: node.seconds, reverse=True)[:num_nodes]:
+                lines.append('{:<32} {:>5} {:>10} {:>11.3f} {:>12}'.format(
+                    node.name, node.type, node.offset, node.seconds * 1e3, node.bytes))
+
+        return '\n'.join(lines)
+
+
+@contextmanager
+def profile(tracer=None):  # not thread-safe, the wrappers are installed on the parser classes
+    current = Profile(tracer)
+
+    originals = []
+    for owner, attribute, section in SECTIONS:
+        original = owner.__dict__[attribute]
+        originals.append((owner, attribute, original))
+
+        if isinstance(original, staticmethod):
+            setattr(owner, attribute, staticmethod(current.wrap(original.__func__, section, 0)))
+        elif isinstance(owner, type):
+            setattr(owner, attribute, current.wrap(original, section, 1))
+        else:  # module function
+            setattr(owner, attribute, current.wrap(original, section, 0))
+
+    try:
+        yield current
+    finally:
+        for owner, attribute, original in reversed(originals):
+            setattr(owner, attribute, original)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m mafia_4ds.profile_parsers',
+                                     description='Show where parsing a 4ds or 5ds file spends its time.')
+    parser.add_argument('filepath', help='4ds or 5ds file')
+    parser.add_argument('--lazy', action='store_true', help='read a 4ds lazily, a 5ds as an index')
+    parser.add_argument('--nodes', type=int, default=10, help='number of slowest nodes listed')
+    args = parser.parse_args(argv)
+
+    reader = BufferReader.from_file(args.filepath)
+    with profile() as current:
+        if args.filepath.lower().endswith('.4ds'):
+            FourDS.FourDSFile().read(reader, args.lazy)
+        elif args.lazy:
+            FiveDS.FiveDSIndex().read(reader)
+        else:
+            FiveDS.FiveDSFile().read(reader)
+
+    print(current.report(args.nodes))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,103 @@
+import numpy as np
+
+
+IDENTITY_ROTATION = (1.0, 0.0, 0.0, 0.0)  # in the component order of rotation_keys
+ZERO_POSITION = (0.0, 0.0, 0.0)
+UNIT_SCALE = (1.0, 1.0, 1.0)
+
+
+class Pose:  # dense animation, arrays indexed by bone, then frame
+    def __init__(self):
+        self.bone_names = None
+        self.frames = None  # (num_frames,) float64 array of the sampled frame times
+        self.rotations = None  # (num_bones, num_frames, 4) float32 array
+        self.positions = None  # (num_bones, num_frames, 3) float32 array
+        self.scales = None  # (num_bones, num_frames, 3) float32 array
+        self.has_rotation = None  # (num_bones,) bool arrays, bones without a track hold the default
+        self.has_position = None
+        self.has_scale = None
+
+
+def sample_animation(five_ds, frames, bones=None):
+    # five_ds is a FiveDSFile or a FiveDSIndex, bones an optional list of bone names or indices
+    # keys are held constant before the first and after the last keyframe of a track
+    if bones is None:
+        bones = range(len(five_ds.bone_names))
+
+    # a FiveDSIndex decodes only the requested bones
+    bone_map = dict((name, bone_id) for bone_id, name in enumerate(five_ds.bone_names))
+    anims = [five_ds.bone_animations[bone_map[bone] if isinstance(bone, str) else bone] for bone in bones]
+
+    pose = Pose()
+    pose.bone_names = [five_ds.bone_names[bone] if not isinstance(bone, str) else bone for bone in bones]
+    pose.frames = np.asarray(frames, dtype=np.float64).reshape(-1)
+
+    rotation_tracks = [(anim.rotation_frames, anim.rotation_keys) if anim.has_rotation else None for anim in anims]
+    position_tracks = [(anim.position_frames, anim.position_keys) if anim.has_position else None for anim in anims]
+    scale_tracks = [(anim.scale_frames, anim.scale_keys) if anim.has_scale else None for anim in anims]
+
+    pose.rotations, pose.has_rotation = sample_tracks(rotation_tracks, pose.frames, IDENTITY_ROTATION, slerp)
+    pose.positions, pose.has_position = sample_tracks(position_tracks, pose.frames, ZERO_POSITION, lerp)
+    pose.scales, pose.has_scale = sample_tracks(scale_tracks, pose.frames, UNIT_SCALE, lerp)
+    return pose
+
+
+def sample_tracks(tracks, times, default, interpolate):
+    # tracks is a list of (frames, keys) or None per bone, all of them are sampled together
+    num_tracks = len(tracks)
+    samples = np.empty((num_tracks, len(times), len(default)), dtype=np.float32)
+    samples[:] = default
+
+    has_track = np.array([track is not None and len(track[0]) > 0 for track in tracks], dtype=bool)
+    present = np.flatnonzero(has_track)
+    if len(present) == 0 or len(times) == 0:
+        return samples, has_track
+
+    track_frames = [tracks[i][0] for i in present]
+    lengths = np.array([len(frames) for frames in track_frames])
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+
+    all_frames = np.concatenate(track_frames).astype(np.float64)
+    all_keys = np.concatenate([tracks[i][1] for i in present]).astype(np.float64)
+
+    # clamp the times into each track, then search all tracks at once by moving every
+    # track into its own range of the frame axis (frame numbers are 16 bit)
+    span = 65536.0
+    segment = np.repeat(np.arange(len(present)), lengths)
+    first = all_frames[starts][:, None]
+    last = all_frames[ends - 1][:, None]
+    clamped = np.clip(times[None, :], first, last)
+    shift = np.arange(len(present))[:, None] * span
+
+    left = np.searchsorted(all_frames + segment * span, clamped + shift, side='right') - 1
+    left = np.clip(left, starts[:, None], (ends - 1)[:, None])
+    right = np.minimum(left + 1, (ends - 1)[:, None])
+
+    frame_left = all_frames[left]
+    frame_delta = all_frames[right] - frame_left
+    factor = np.divide(clamped - frame_left, frame_delta, out=np.zeros_like(frame_left), where=frame_delta > 0)
+
+    samples[present] = interpolate(all_keys[left], all_keys[right], factor[..., None])
+    return samples, has_track
+
+
+def lerp(a, b, factor):
+    return a + (b - a) * factor
+
+
+def slerp(a, b, factor):  # batched over all leading axes, quaternions in the last one
+    dot = np.sum(a * b, axis=-1, keepdims=True)
+    b = np.where(dot < 0.0, -b, b)  # take the shorter arc
+    dot = np.abs(dot)
+
+    # nearly parallel quaternions fall back to normalized lerp
+    linear = dot > 0.9995
+    theta = np.arccos(np.clip(dot, -1.0, 1.0))
+    sin_theta = np.where(linear, 1.0, np.sin(theta))
+    weight_a = np.where(linear, 1.0 - factor, np.sin((1.0 - factor) * theta) / sin_theta)
+    weight_b = np.where(linear, factor, np.sin(factor * theta) / sin_theta)
+
+    result = weight_a * a + weight_b * b
+    length = np.linalg.norm(result, axis=-1, keepdims=True)
+    return result / np.where(length > 0.0, length, 1.0)
@@ -0,0 +1,142 @@
+# headless scan of the game data directory, parses every 4ds and 5ds file in parallel
+# usage: python -m mafia_4ds.scan_data <game data path> [--jobs N] [--csv summary.csv] [--failures-only]
+
+import argparse
+import csv
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from . io_helper import BufferReader
+from . import parse_4ds as FourDS
+from . import parse_5ds as FiveDS
+from . import validate_4ds
+
+
+COLUMNS = ('path', 'nodes', 'vertices', 'faces', 'materials', 'textures', 'bones', 'frames', 'seconds', 'error')
+
+
+def find_files(data_path):  # all 4ds and 5ds files, extensions are matched case-insensitively
+    paths = []
+    for directory, _, filenames in os.walk(data_path):
+        for filename in filenames:
+            if os.path.splitext(filename)[1].lower() in ('.4ds', '.5ds'):
+                paths.append(os.path.join(directory, filename))
+
+    paths.sort()
+    return paths
+
+
+def summarize_4ds(fo, row):
+    row['nodes'] = len(fo.nodes)
+    row['materials'] = len(fo.materials)
+
+    textures = set()
+    for material in fo.materials:
+        textures.update(texture for texture in (material.diffuse_texture,
+                                                material.alpha_texture,
+                                                material.environment_texture) if texture)
+    row['textures'] = len(textures)
+
+    row['vertices'] = 0
+    row['faces'] = 0
+    for node in fo.nodes:
+        if node.type == 0x01:
+            for lod in node.frame.object.lods:
+                row['vertices'] += lod.num_vertices
+                row['faces'] += sum(len(face_group.indices) for face_group in lod.face_groups)
+
+    row['bones'] = sum(1 for node in fo.nodes if node.type == 10)
+
+
+def summarize_5ds(fi, row):
+    row['bones'] = len(fi.bone_animations)
+    row['frames'] = fi.num_frames
+
+
+def scan_file(path):  # runs in a worker process, never raises
+    row = dict((column, None) for column in COLUMNS)
+    row['path'] = path
+
+    start = time.perf_counter()
+    try:
+        reader = BufferReader.from_file(path)
+        if path.lower().endswith('.4ds'):
+            fo = FourDS.FourDSFile()
+            fo.read(reader)
+            summarize_4ds(fo, row)
+            validate_4ds.check(fo, max_issues=3)
+        else:
+            fi = FiveDS.FiveDSFile()
+            fi.read(reader)
+            summarize_5ds(fi, row)
+    except Exception as e:
+        row['error'] = '{}: {}'.format(type(e).__name__, str(e).replace('\n', '; '))
+
+    row['seconds'] = time.perf_counter() - start
+    return row
+
+
+def scan(data_path, jobs=None):
+    paths = find_files(data_path)
+    jobs = jobs or os.cpu_count() or 1
+    chunksize = max(1, len(paths) // (4 * jobs))  # a few chunks per worker keeps them evenly busy
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(scan_file, paths, chunksize=chunksize))
+
+
+def format_table(rows, data_path):
+    lines = [list(COLUMNS)]
+    for row in rows:
+        line = []
+        for column in COLUMNS:
+            value = row[column]
+            if column == 'path':
+                value = os.path.relpath(value, data_path)
+            elif column == 'seconds':
+                value = '{:.4f}'.format(value)
+            line.append('' if value is None else str(value))
+        lines.append(line)
+
+    widths = [max(len(line[i]) for line in lines) for i in range(len(COLUMNS) - 1)]
+    return '\n'.join('  '.join([cell.ljust(width) for cell, width in zip(line, widths)] + [line[-1]]).rstrip()
+                     for line in lines)
+
+
+def write_csv(rows, filepath):
+    with open(filepath, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m mafia_4ds.scan_data',
+                                     description='Parse every 4ds and 5ds file under the game data path.')
+    parser.add_argument('data_path', help='game data directory, the addon DataPath preference')
+    parser.add_argument('--jobs', type=int, default=None, help='worker processes, defaults to the cpu count')
+    parser.add_argument('--csv', help='also write the summary table to this csv file')
+    parser.add_argument('--failures-only', action='store_true', help='list only files which failed to parse')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    rows = scan(args.data_path, args.jobs)
+    elapsed = time.perf_counter() - start
+
+    failures = [row for row in rows if row['error']]
+    shown = failures if args.failures_only else rows
+    if shown:
+        print(format_table(shown, args.data_path))
+
+    if args.csv:
+        write_csv(rows, args.csv)
+
+    print('{} files, {} failed, parsed in {:.2f} s ({:.2f} s in parsers)'.format(
+        len(rows), len(failures), elapsed, sum(row['seconds'] for row in rows)))
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,64 @@
+# case-insensitive lookup of textures in the maps directory of the game data
+# 4ds files name textures in any case, the files on disk have their own, which matters on case-sensitive filesystems
+# the directory is listed once and listed again only when its mtime changes
+
+import os
+
+
+class TextureIndex:
+    def __init__(self, data_path):
+        self.data_path = data_path
+        self.maps_path = None
+        self.mtime = None
+        self.paths = {}  # lowercase file name to real path
+
+    def refresh(self):
+        maps_path = find_entry(self.data_path, 'maps') or os.path.join(self.data_path, 'maps')
+        try:
+            mtime = os.stat(maps_path).st_mtime_ns
+        except OSError:  # no maps directory (yet)
+            mtime = None
+
+        if maps_path == self.maps_path and mtime == self.mtime:
+            return
+
+        self.maps_path = maps_path
+        self.mtime = mtime
+        self.paths = {}
+        if mtime is not None:
+            for entry in os.scandir(maps_path):
+                if entry.is_file():
+                    self.paths.setdefault(entry.name.lower(), entry.path)
+
+    def find(self, texture):  # real path of a texture file name, None if it's missing
+        self.refresh()
+        return self.paths.get(os.path.basename(texture.replace('\\', '/')).lower())
+
+    def path(self, texture):  # like find, missing textures get the path they are expected at
+        return self.find(texture) or os.path.join(self.maps_path, texture)
+
+
+def find_entry(directory, name):  # directory entry matching name case-insensitively
+    path = os.path.join(directory, name)
+    if os.path.exists(path):
+        return path
+
+    try:
+        for entry in os.scandir(directory):
+            if entry.name.lower() == name:
+                return entry.path
+    except OSError:
+        pass
+
+    return None
+
+
+_indexes = {}
+
+
+def texture_index(data_path):  # shared by all imports of the session
+    index = _indexes.get(data_path)
+    if index is None:
+        index = _indexes[data_path] = TextureIndex(data_path)
+
+    return index
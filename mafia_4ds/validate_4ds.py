@@ -0,0 +1,112 @@
+# structural checks of a parsed 4ds file, run before importing and after exporting
+# every check works on whole arrays, a model of 100k faces is checked in a few milliseconds
+
+import numpy as np
+
+
+def validate(fo):  # list of problems found in a FourDSFile, empty when it's fine
+    issues = []
+    num_materials = len(fo.materials)
+    num_nodes = len(fo.nodes)
+
+    validate_hierarchy(fo.nodes, issues)
+
+    for node in fo.nodes:
+        if node.type != 0x01:
+            continue
+
+        mesh = node.frame.object
+        if mesh.instance_id > 0:
+            if mesh.instance_id > num_nodes or fo.nodes[mesh.instance_id - 1].type != 0x01:
+                issues.append("node '{}': instanced mesh {} is not a visual node".format(node.name, mesh.instance_id))
+            continue
+
+        for lod_id, lod in enumerate(mesh.lods):
+            validate_lod(node.name, lod_id, lod, num_materials, issues)
+
+        if mesh.has_weights:
+            if len(mesh.skins) != len(mesh.lods):
+                issues.append("node '{}': {} skins for {} lods".format(node.name, len(mesh.skins), len(mesh.lods)))
+
+            for lod_id, (lod, skin) in enumerate(zip(mesh.lods, mesh.skins)):
+                validate_skin(node.name, lod_id, lod, skin, issues)
+
+        if mesh.has_shape_keys and mesh.shape_keys.num_targets > 0:
+            validate_shape_keys(node.name, mesh, issues)
+
+    return issues
+
+
+def validate_hierarchy(nodes, issues):
+    # parent ids are 1-based, 0 means no parent
+    parent_ids = np.array([node.parent_id for node in nodes], dtype=np.int64)
+    num_nodes = len(parent_ids)
+
+    invalid = np.flatnonzero((parent_ids > num_nodes) | (parent_ids == np.arange(1, num_nodes + 1)))
+    for node_id in invalid.tolist():
+        issues.append("node '{}': invalid parent id {}".format(nodes[node_id].name, parent_ids[node_id]))
+
+    # pointer jumping, after log2(n) doublings every node outside of a cycle reaches the root
+    parents = np.concatenate(([0], parent_ids))
+    parents[1:][invalid] = 0
+    for _ in range(max(1, num_nodes).bit_length() + 1):
+        parents = parents[parents]
+
+    for node_id in np.flatnonzero(parents[1:]).tolist():
+        issues.append("node '{}': parent hierarchy contains a cycle".format(nodes[node_id].name))
+
+
+def validate_lod(name, lod_id, lod, num_materials, issues):
+    vertex_data = lod.vertex_data  # its length is the vertex count, as for Lod.write, num_vertices is only set by read
+    bad_vertices = np.count_nonzero(~np.isfinite(vertex_data).all(axis=1))
+    if bad_vertices:
+        issues.append("node '{}' lod {}: {} vertices with NaN or infinite values".format(name, lod_id, bad_vertices))
+
+    for face_group_id, face_group in enumerate(lod.face_groups):
+        indices = face_group.indices
+        if len(indices) > 0 and indices.max() >= len(vertex_data):
+            bad_faces = np.count_nonzero((indices >= len(vertex_data)).any(axis=1))
+            issues.append("node '{}' lod {} face group {}: {} faces index past the {} vertices".format(
+                name, lod_id, face_group_id, bad_faces, len(vertex_data)))
+
+        if face_group.material_id > num_materials:  # 0 is no material
+            issues.append("node '{}' lod {} face group {}: material id {} out of {} materials".format(
+                name, lod_id, face_group_id, face_group.material_id, num_materials))
+
+
+def validate_skin(name, lod_id, lod, skin, issues):
+    counts = np.array([(vg.num_locked_vertices, vg.num_weighted_vertices) for vg in skin.vertex_groups],
+                      dtype=np.int64).reshape(-1, 2)
+    num_covered = int(counts.sum())
+    if num_covered > len(lod.vertex_data):
+        issues.append("node '{}' lod {}: vertex groups cover {} vertices of {}".format(
+            name, lod_id, num_covered, len(lod.vertex_data)))
+
+    weights = [vg.weights for vg in skin.vertex_groups if len(vg.weights)]
+    if weights and not np.isfinite(np.concatenate(weights)).all():
+        issues.append("node '{}' lod {}: NaN or infinite vertex weights".format(name, lod_id))
+
+
+def validate_shape_keys(name, mesh, issues):
+    shape_keys = mesh.shape_keys
+    for lod_id, lod_regions in enumerate(shape_keys.regions):
+        num_vertices = len(mesh.lods[lod_id].vertex_data) if lod_id < len(mesh.lods) else 0
+
+        for region_id, region in enumerate(lod_regions):
+            if region.vertex_indices is not None and len(region.vertex_indices) > 0 and \
+                    region.vertex_indices.max() >= num_vertices:
+                issues.append("node '{}' lod {} morph region {}: vertex indices past the {} vertices".format(
+                    name, lod_id, region_id, num_vertices))
+
+            if not (np.isfinite(region.positions).all() and np.isfinite(region.normals).all()):
+                issues.append("node '{}' lod {} morph region {}: NaN or infinite morph targets".format(
+                    name, lod_id, region_id))
+
+
+def check(fo, max_issues=20):  # raises ValueError listing the problems
+    issues = validate(fo)
+    if issues:
+        lines = issues[:max_issues]
+        if len(issues) > max_issues:
+            lines.append('... and {} more'.format(len(issues) - max_issues))
+        raise ValueError('Invalid 4ds file:\n' + '\n'.join(lines))